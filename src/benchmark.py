@@ -0,0 +1,150 @@
+#!/usr/bin/env python3.7
+
+"""Compares the event loop backends of the game server side by side.
+
+For each backend, starts a game server in a separate process and measures:
+
+- connections per second: clients connect, select the JSON lines protocol
+  and wait for the welcome line. At most _MAX_CONNECTING clients connect at
+  a time, so that the listen backlog of the server does not overflow and
+  the rate does not depend on SYN retransmits. Connections are measured in
+  a few runs and the median and the range of the runs are reported.
+- move latency: pairs of bots play games against each other over the JSON
+  lines protocol. Latency of a move is the time between sending the move and
+  receiving its response.
+
+# Run:
+python3 benchmark.py [-h] [--backends BACKENDS [BACKENDS ...]]
+                     [--port [PORT]] [--connections [CONNECTIONS]]
+                     [--pairs [PAIRS]] [--games [GAMES]] [--runs [RUNS]]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from game_bot import Bot
+
+
+_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_server.py")
+_HOST = "localhost"
+_NUM_ROWS = 4
+_NUM_COLS = 6
+_DEFAULT_BACKENDS = ["curio", "asyncio"]
+_DEFAULT_PORT = 10690
+_DEFAULT_NUM_CONNECTIONS = 1000
+_DEFAULT_NUM_PAIRS = 50
+_DEFAULT_NUM_GAMES = 20
+_DEFAULT_NUM_RUNS = 3
+# the servers listen with a backlog of 100
+_MAX_CONNECTING = 50
+
+
+async def _connect(port, name):
+    reader, writer = await asyncio.open_connection(_HOST, port)
+    writer.write(("@json %s\n" % name).encode("UTF-8"))
+    # skip the name prompt and the welcome line
+    await reader.readline()
+    await reader.readline()
+    return reader, writer
+
+
+async def _measure_connections(port, num_connections):
+    connecting = asyncio.Semaphore(_MAX_CONNECTING)
+
+    async def connect(name):
+        async with connecting:
+            return await _connect(port, name)
+
+    started = time.perf_counter()
+    clients = await asyncio.gather(
+        *[connect("c%d" % i) for i in range(num_connections)])
+    elapsed = time.perf_counter() - started
+    for (reader, writer) in clients:
+        writer.close()
+    return num_connections / elapsed
+
+
+async def _measure_moves(port, num_pairs, num_games):
+    bots = []
+    for i in range(num_pairs * 2):
+        reader, writer = await _connect(port, "b%d" % i)
+        bots.append(Bot("b%d" % i, reader, writer))
+    started = time.perf_counter()
+    await asyncio.gather(*[bot.play(num_games) for bot in bots])
+    elapsed = time.perf_counter() - started
+    for bot in bots:
+        bot.writer.close()
+    latencies = sorted(latency for bot in bots for latency in bot.latencies)
+    return len(latencies) / elapsed, latencies
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def _wait_for_server(port):
+    for i in range(100):
+        try:
+            reader, writer = await asyncio.open_connection(_HOST, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("the game server did not start")
+
+
+async def _run_benchmark(port, num_connections, num_pairs, num_games, num_runs):
+    await _wait_for_server(port)
+    connection_rates = []
+    for i in range(num_runs):
+        connection_rates.append(await _measure_connections(port, num_connections))
+        # let the server drop the connections of the previous run
+        await asyncio.sleep(1)
+    moves_per_sec, latencies = await _measure_moves(port, num_pairs, num_games)
+    return sorted(connection_rates), moves_per_sec, latencies
+
+
+def _benchmark_backend(backend, port, num_connections, num_pairs, num_games, num_runs):
+    name, _, loop = backend.partition(":")
+    command = [sys.executable, _SERVER, "--port", str(port), "--rows", str(_NUM_ROWS),
+               "--cols", str(_NUM_COLS), "--backend", name, "--log-level", "CRITICAL"]
+    if loop:
+        command += ["--loop", loop]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        return asyncio.run(_run_benchmark(port, num_connections, num_pairs, num_games, num_runs))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the event loop backends of the game server.')
+    parser.add_argument("--backends", dest="backends", nargs='+', default=_DEFAULT_BACKENDS,
+                        help="backends to compare, such as curio, asyncio or asyncio:uvloop")
+    parser.add_argument("--port", dest="port", type=int, nargs='?', default=_DEFAULT_PORT,
+                        help="port of the game servers")
+    parser.add_argument("--connections", dest="connections", type=int, nargs='?',
+                        default=_DEFAULT_NUM_CONNECTIONS, help="number of connections to open")
+    parser.add_argument("--pairs", dest="pairs", type=int, nargs='?', default=_DEFAULT_NUM_PAIRS,
+                        help="number of bot pairs playing at the same time")
+    parser.add_argument("--games", dest="games", type=int, nargs='?', default=_DEFAULT_NUM_GAMES,
+                        help="number of games played by each pair")
+    parser.add_argument("--runs", dest="runs", type=int, nargs='?', default=_DEFAULT_NUM_RUNS,
+                        help="number of runs of the connections phase")
+    args = parser.parse_args()
+
+    print("%-16s %12s %14s %12s %10s %10s %10s" %
+          ("backend", "conn/s", "conn/s range", "moves/s", "p50 ms", "p90 ms", "p99 ms"))
+    for backend in args.backends:
+        connection_rates, moves_per_sec, latencies = _benchmark_backend(
+            backend, args.port, args.connections, args.pairs, args.games, args.runs)
+        print("%-16s %12.0f %14s %12.0f %10.3f %10.3f %10.3f" % (
+            backend, _percentile(connection_rates, 0.5),
+            "%.0f-%.0f" % (connection_rates[0], connection_rates[-1]), moves_per_sec, _percentile(latencies, 0.5) * 1000,
+            _percentile(latencies, 0.9) * 1000, _percentile(latencies, 0.99) * 1000))
@@ -48,6 +48,10 @@ class _Cell:
     def open(self):
         self._status = _Cell._OPEN
 
+    def reset(self, symbol):
+        self._status = _Cell._CLOSED
+        self._symbol = symbol
+
 
 class Game:
     """Contains logic for the match symbols game.
@@ -72,16 +76,30 @@ class Game:
         if len(symbols) < 2 or len(symbols) != len(set(iter(symbols))) \
                 or not player1 or not player2 or player1 == player2:
             raise ValueError
-        symbols = list(iter(symbols))
         self._win_score = len(symbols) // 2 + 1
-        symbols = symbols + symbols
-        random.shuffle(symbols)
         self._deck = []
-        for symbol in symbols:
-            self._deck.append(_Cell(symbol))
+        for i in range(0, len(symbols) * 2):
+            self._deck.append(_Cell(None))
         self._player1 = player1
         self._player2 = player2
-        self._turn = player2 if random.randint(0, 1) else player1
+        self.reset(symbols)
+
+    def reset(self, symbols=None):
+        """Starts a new game between the same players in place.
+
+        The deck is shuffled again. If symbols are given, they replace the
+        current symbols. They must be unique and as many as the current ones.
+        """
+        if symbols is None:
+            symbols = list(dict.fromkeys(cell.symbol() for cell in self._deck))
+        elif len(symbols) * 2 != len(self._deck) or len(symbols) != len(set(iter(symbols))):
+            raise ValueError
+        symbols = list(iter(symbols))
+        symbols = symbols + symbols
+        random.shuffle(symbols)
+        for i in range(0, len(symbols)):
+            self._deck[i].reset(symbols[i])
+        self._turn = self._player2 if random.randint(0, 1) else self._player1
         self._prev_cell = None
         self._score1 = 0
         self._score2 = 0
@@ -0,0 +1,105 @@
+import json
+import time
+
+
+class Bot:
+    """Plays the game over the JSON lines protocol by remembering symbols.
+
+    reader has an async readline() method, and writer has a write() method
+    which sends a move. Subclasses may override send() for other writers.
+    """
+
+    def __init__(self, name, reader, writer):
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.latencies = []
+        # games won and the total score over all games
+        self.wins = 0
+        self.points = 0
+        self._index = 0
+        self._num_cols = 0
+        self._num_cells = 0
+        self._known = {}
+        self._opened = set()
+        self._first = None
+        self._picks = 0
+
+    async def send(self, data):
+        self.writer.write(data)
+
+    async def play(self, num_games):
+        """Plays the given number of games and returns"""
+        games = 0
+        sent_at = None
+        while games < num_games:
+            line = await self.reader.readline()
+            if not line:
+                return
+            if sent_at:
+                self.latencies.append(time.perf_counter() - sent_at)
+                sent_at = None
+            message = json.loads(line)
+            kind = message["t"]
+            if kind == "start":
+                self._index = message["players"].index(self.name)
+                self._num_cols = message["cols"]
+                self._num_cells = message["rows"] * message["cols"]
+                self._known = {}
+                self._opened = set()
+                self._first = None
+                self._picks = 0
+            elif kind == "move":
+                self._update(message["cells"])
+            elif kind == "over":
+                games += 1
+                if message["winner"] == self.name:
+                    self.wins += 1
+                self.points += message["scores"][self._index]
+                continue
+            elif kind == "error":
+                self._first = None
+                self._picks = 0
+            else:
+                continue
+
+            if message["turn"] == self.name:
+                index = self._pick()
+                await self.send(b"%d%c\n" % (index // self._num_cols + 1,
+                                             ord("A") + index % self._num_cols))
+                sent_at = time.perf_counter()
+
+    def _update(self, cells):
+        for (index, label) in cells:
+            if label == " ":
+                self._opened.add(index)
+                self._known.pop(index, None)
+            elif label != ".":
+                self._known[index] = label
+        if self._picks == 2:
+            self._first = None
+            self._picks = 0
+
+    def _pick(self):
+        closed = [i for i in range(self._num_cells) if i not in self._opened]
+        if self._first is None:
+            seen = {}
+            for i in closed:
+                symbol = self._known.get(i)
+                if symbol in seen:
+                    index = seen[symbol]
+                    break
+                elif symbol:
+                    seen[symbol] = i
+            else:
+                unknown = [i for i in closed if i not in self._known]
+                index = (unknown or closed)[0]
+            self._first = index
+        else:
+            symbol = self._known.get(self._first)
+            others = [i for i in closed if i != self._first]
+            pairs = [i for i in others if self._known.get(i) == symbol]
+            unknown = [i for i in others if i not in self._known]
+            index = (pairs or unknown or others)[0]
+        self._picks += 1
+        return index
@@ -1,13 +1,18 @@
 
 import game
+import json
 import random
 import string
 
 
 RESET_TERMINAL_CODE = "\033[F\033[K"
 GAME_OVER_KEY = 1
+RESULT_KEY = 2
+TEXT_PROTOCOL = "text"
+JSON_PROTOCOL = "json"
 
 _RESET_LINE_CODE = "\033[K"
+_CLEAR_SCREEN_CODE = "\033[H\033[2J"
 _INPUT_PROMPT = "enter coordinates (for instance, 1A): "
 _WAIT_MESSAGE = "waiting for your opponent to play"
 _ROW_LABELS = list(map(str, list(range(1, 10))))
@@ -42,11 +47,34 @@ def _to_index(num_rows, num_cols, row_ch, col_ch):
     return _to_row(row_ch, num_rows) * num_cols + _to_col(col_ch, num_cols)
 
 
+def _to_json_line(message):
+    return json.dumps(message, separators=(",", ":")) + "\n"
+
+
+def format_session(protocol, token):
+    """Formats the session token message for a client of the given protocol"""
+    if protocol == JSON_PROTOCOL:
+        return _to_json_line({"t": "session", "token": token})
+    return f"Your session token is %s. If you get disconnected, type \"@resume %s\" " \
+        "as your name to get back into your game.\n" % (token, token)
+
+
+def format_notice(protocol, text):
+    """Formats a lobby or server message for a client of the given protocol.
+
+    Text clients get the message as is, while JSON clients get it in an
+    "info" line.
+    """
+    if protocol == JSON_PROTOCOL:
+        return _to_json_line({"t": "info", "msg": text.strip()})
+    return text
+
+
 class GameController:
     """Receives inputs from players, applies them on the game and returns
     views for users."""
 
-    def __init__(self, num_rows, num_cols, player1, player2):
+    def __init__(self, num_rows, num_cols, player1, player2, protocols=None):
         """Initializes the controller object with the given parameters.
 
         The match symbols game deck is displayed in a matrix with an even
@@ -54,16 +82,29 @@ class GameController:
         symbol is placed twice, hence there can be at most 52 cells. Moreover,
         there can be at most 9 rows and 26 columns, because rows are labeled
         from 1 to 9 and columns are labeled from A to Z.
+
+        protocols optionally maps players to either TEXT_PROTOCOL or
+        JSON_PROTOCOL. Players are served with TEXT_PROTOCOL by default.
         """
-        if not 1 <= num_rows <= 9 or not 1 <= num_cols <= 26 \
-                or num_rows * num_cols > 52 or num_rows * num_cols // 2 == 1:
+        if not 1 <= num_rows <= 9 or not 1 <= num_cols <= 26 or num_rows * num_cols > 52 \
+                or num_rows * num_cols % 2 or num_rows * num_cols // 2 == 1:
             raise ValueError
         self._num_rows = num_rows
         self._num_cols = num_cols
-        symbols = list(iter(string.ascii_lowercase))
-        random.shuffle(symbols)
-        symbols = "".join(symbols[:num_rows * num_cols // 2])
-        self._game = game.Game(symbols, player1, player2)
+        self._game = game.Game(self._pick_symbols(), player1, player2)
+        self._protocols = {
+            player1: TEXT_PROTOCOL,
+            player2: TEXT_PROTOCOL
+        }
+        if protocols:
+            self._protocols.update(protocols)
+        # last deck labels sent to players. JSON players only receive
+        # the cells which differ from this deck.
+        self._deck_view = [game.CLOSED_CELL_LABEL] * (num_rows * num_cols)
+        self._last_result = None
+        # winner of the previous game, shown to spectators until the first
+        # move of the next game
+        self._prev_winner = None
         self._initial_views = {
             player1: self._generate_initial_view(player1),
             player2: self._generate_initial_view(player2)
@@ -72,6 +113,22 @@ class GameController:
         # +3 consists of the score line, input prompt and the cursor's line
         self._view_reset = RESET_TERMINAL_CODE * (num_rows + 3)
 
+    def reset(self):
+        """Starts a new game between the same players with a new deck.
+
+        The controller and its game are reused, hence players can start a
+        rematch without creating a new controller.
+        """
+        self._prev_winner = self._last_result.get(game.WINNER_KEY) if self._last_result else None
+        self._game.reset(self._pick_symbols())
+        self._deck_view = [game.CLOSED_CELL_LABEL] * (self._num_rows * self._num_cols)
+        self._last_result = None
+        players = self._game.players()
+        self._initial_views = {
+            players[0]: self._generate_initial_view(players[0]),
+            players[1]: self._generate_initial_view(players[1])
+        }
+
     def initial_views(self):
         """Returns the initial view to be shown to the players"""
         return self._initial_views
@@ -84,7 +141,9 @@ class GameController:
 
         Return values are dictionaries. There is a key for each player and
         the value is the view string which must be shown for that player.
-        There is also a GAME_OVER_KEY with a boolean value.
+        There is also a GAME_OVER_KEY with a boolean value. When the game is
+        over, RESULT_KEY contains a tuple of the winner, which is None for a
+        tie, and the scores of the players.
         """
         if not cell_str or len(cell_str) != 2:
             return self._invalid_input_response(player)
@@ -94,11 +153,19 @@ class GameController:
             play_result = self._game.play(player, index)
         except (IndexError, ValueError) as e:
             return self._invalid_input_response(player)
+        self._last_result = play_result
         players = self._game.players()
         if not play_result.get(game.WINNER_KEY):
+            prev_deck = self._deck_view
+            self._deck_view = play_result[game.DECK_KEY]
+            json_view = None
+            if JSON_PROTOCOL in self._protocols.values():
+                json_view = self._generate_json_view(play_result, prev_deck)
             return {
-                players[0]: self._generate_game_view(play_result, players[0]),
-                players[1]: self._generate_game_view(play_result, players[1]),
+                players[0]: json_view if self._is_json(players[0])
+                else self._generate_game_view(play_result, players[0]),
+                players[1]: json_view if self._is_json(players[1])
+                else self._generate_game_view(play_result, players[1]),
                 GAME_OVER_KEY: False
             }
         else:
@@ -109,32 +176,109 @@ class GameController:
             else:
                 message = f"%s: %d, %s: %d\nGame over... It is a tie!\n" % (
                     players[0], play_result[players[0]], players[1], play_result[players[1]])
+            json_message = _to_json_line({
+                "t": "over",
+                "scores": [play_result[players[0]], play_result[players[1]]],
+                "winner": winner if winner != game.TIE else None
+            })
 
-            return {players[0]: message, players[1]: message, GAME_OVER_KEY: True}
+            return {
+                players[0]: json_message if self._is_json(players[0]) else message,
+                players[1]: json_message if self._is_json(players[1]) else message,
+                GAME_OVER_KEY: True,
+                RESULT_KEY: (winner if winner != game.TIE else None,
+                             play_result[players[0]], play_result[players[1]])
+            }
+
+    def spectator_view(self):
+        """Returns a full-screen view of the game for spectators.
+
+        The view is self-contained so that spectators who miss some moves can
+        just show the latest one. Rematches start right after a game is over,
+        so the result of the previous game is shown until the first move of
+        the next game.
+        """
+        players = self._game.players()
+        buffer = [_CLEAR_SCREEN_CODE]
+        buffer.append(f"%s vs %s\n" % (players[0], players[1]))
+        buffer.append(self._generate_deck_view(self._deck_view))
+        scores = self._scores()
+        buffer.append(f"\n%s: %d, %s: %d" % (players[0], scores[0], players[1], scores[1]))
+
+        winner = self._last_result.get(game.WINNER_KEY) if self._last_result else None
+        if not winner:
+            if not self._last_result and self._prev_winner == game.TIE:
+                buffer.append("\nPrevious game... It was a tie!")
+            elif not self._last_result and self._prev_winner:
+                buffer.append(f"\nPrevious game... %s won!" % (self._prev_winner))
+            buffer.append(f"\n%s's turn\n" % (self._game.whose_turn()))
+        elif winner != game.TIE:
+            buffer.append(f"\nGame over... %s won!\n" % (winner))
+        else:
+            buffer.append("\nGame over... It is a tie!\n")
+
+        return "".join(buffer)
+
+    def resync_view(self, player):
+        """Returns the full view of the ongoing game for the given player.
+
+        It is used when a player reconnects in the middle of a game. Unlike
+        the views returned by play(), it does not rely on the previous views
+        shown to the player.
+        """
+        if self._is_json(player):
+            return _to_json_line({
+                "t": "sync",
+                "rows": self._num_rows,
+                "cols": self._num_cols,
+                "players": list(self._game.players()),
+                "turn": self._game.whose_turn(),
+                "deck": self._deck_view,
+                "scores": list(self._scores())
+            })
+        return self._generate_full_view(player)
+
+    def _scores(self):
+        if not self._last_result:
+            return (0, 0)
+        players = self._game.players()
+        return (self._last_result[players[0]], self._last_result[players[1]])
+
+    def _pick_symbols(self):
+        symbols = list(iter(string.ascii_lowercase))
+        random.shuffle(symbols)
+        return "".join(symbols[:self._num_rows * self._num_cols // 2])
+
+    def _is_json(self, player):
+        return self._protocols.get(player) == JSON_PROTOCOL
 
     def _invalid_input_response(self, player):
-        if player == self._game.whose_turn():
+        if self._is_json(player):
+            return {player: _to_json_line({"t": "error", "turn": self._game.whose_turn()}), GAME_OVER_KEY: False}
+        elif player == self._game.whose_turn():
             return {player: RESET_TERMINAL_CODE + _INPUT_PROMPT, GAME_OVER_KEY: False}
         else:
             return {player: (RESET_TERMINAL_CODE * 2) + _WAIT_MESSAGE + "\n", GAME_OVER_KEY: False}
 
     def _generate_initial_view(self, player):
+        if self._is_json(player):
+            return _to_json_line({
+                "t": "start",
+                "rows": self._num_rows,
+                "cols": self._num_cols,
+                "players": list(self._game.players()),
+                "turn": self._game.whose_turn()
+            })
+
+        return self._generate_full_view(player)
+
+    def _generate_full_view(self, player):
         buffer = []
-        buffer.append('  ')
-        for col_label in _COL_LABELS[0:self._num_cols]:
-            buffer.append(col_label)
-            buffer.append(' ')
-
-        for row_label in _ROW_LABELS[0:self._num_rows]:
-            buffer.append('\n')
-            buffer.append(row_label)
-            buffer.append(' ')
-            for i in range(0, self._num_cols):
-                buffer.append(game.CLOSED_CELL_LABEL)
-                buffer.append(' ')
+        buffer.append(self._generate_deck_view(self._deck_view))
 
         players = self._game.players()
-        buffer.append(f"\n%s: 0, %s: 0" % (players[0], players[1]))
+        scores = self._scores()
+        buffer.append(f"\n%s: %d, %s: %d" % (players[0], scores[0], players[1], scores[1]))
 
         turn = self._game.whose_turn()
         if player == turn:
@@ -149,6 +293,22 @@ class GameController:
         deck = play_result[game.DECK_KEY]
         buffer = []
         buffer.append(self._view_reset)
+        buffer.append(self._generate_deck_view(deck))
+
+        players = self._game.players()
+        buffer.append(f"\n%s: %d, %s: %d" % (
+            players[0], play_result[players[0]], players[1], play_result[players[1]]))
+
+        if player == play_result[game.WHOSE_TURN_KEY]:
+            buffer.append("\n" + _RESET_LINE_CODE + _INPUT_PROMPT)
+        else:
+            buffer.append("\n" + _RESET_LINE_CODE +
+                          _WAIT_MESSAGE + "\n" + _RESET_LINE_CODE)
+
+        return "".join(buffer)
+
+    def _generate_deck_view(self, deck):
+        buffer = []
         buffer.append('  ')
         for col_label in _COL_LABELS[0:self._num_cols]:
             buffer.append(col_label)
@@ -162,14 +322,18 @@ class GameController:
                 buffer.append(deck[self._num_cols * row + col])
                 buffer.append(' ')
 
-        players = self._game.players()
-        buffer.append(f"\n%s: %d, %s: %d" % (
-            players[0], play_result[players[0]], players[1], play_result[players[1]]))
-
-        if player == play_result[game.WHOSE_TURN_KEY]:
-            buffer.append("\n" + _RESET_LINE_CODE + _INPUT_PROMPT)
-        else:
-            buffer.append("\n" + _RESET_LINE_CODE +
-                          _WAIT_MESSAGE + "\n" + _RESET_LINE_CODE)
-
         return "".join(buffer)
+
+    def _generate_json_view(self, play_result, prev_deck):
+        deck = play_result[game.DECK_KEY]
+        cells = []
+        for i in range(0, len(deck)):
+            if deck[i] != prev_deck[i]:
+                cells.append([i, deck[i]])
+        players = self._game.players()
+        return _to_json_line({
+            "t": "move",
+            "cells": cells,
+            "scores": [play_result[players[0]], play_result[players[1]]],
+            "turn": play_result[game.WHOSE_TURN_KEY]
+        })
@@ -0,0 +1,135 @@
+import json
+import pytest
+from game_controller import GameController, GAME_OVER_KEY, RESULT_KEY, JSON_PROTOCOL, format_notice
+
+
+_player1 = "p1"
+_player2 = "p2"
+
+
+@pytest.fixture
+def controller():
+    return GameController(2, 3, _player1, _player2, {_player1: JSON_PROTOCOL})
+
+
+def _other(player):
+    return _player1 if player == _player2 else _player2
+
+
+def test_json_initial_view(controller):
+    view = json.loads(controller.initial_views()[_player1])
+
+    assert view["t"] == "start"
+    assert view["rows"] == 2
+    assert view["cols"] == 3
+    assert view["players"] == [_player1, _player2]
+    assert view["turn"] == controller._game.whose_turn()
+    assert not controller.initial_views()[_player2].startswith("{")
+
+
+def test_json_move_contains_changed_cells(controller):
+    player = controller._game.whose_turn()
+
+    views = controller.play(player, "1A")
+    view = json.loads(views[_player1])
+
+    assert not views[GAME_OVER_KEY]
+    assert view["t"] == "move"
+    assert view["cells"] == [[0, controller._game._deck[0].symbol()]]
+    assert view["scores"] == [0, 0]
+    assert view["turn"] == player
+    assert "1 " in views[_player2]
+
+    view = json.loads(controller.play(_player1, "1A")[_player1])
+    assert view["t"] == "error"
+
+
+def test_json_game_over(controller):
+    player = controller._game.whose_turn()
+    for (i, j) in controller._game.peek()[:2]:
+        controller.play(player, "%d%s" % (i // 3 + 1, "ABC"[i % 3]))
+        views = controller.play(player, "%d%s" % (j // 3 + 1, "ABC"[j % 3]))
+
+    view = json.loads(views[_player1])
+    assert views[GAME_OVER_KEY]
+    assert view["t"] == "over"
+    assert view["winner"] == player
+    assert "won" in views[_player2]
+
+
+def test_json_notice():
+    assert json.loads(format_notice(JSON_PROTOCOL, "hello\n")) == {"t": "info", "msg": "hello"}
+
+
+def test_spectator_view(controller):
+    player = controller._game.whose_turn()
+
+    assert "%s's turn" % player in controller.spectator_view()
+
+    controller.play(player, "1A")
+    view = controller.spectator_view()
+
+    assert view.startswith("\033[H\033[2J")
+    assert "1 %s . . " % controller._game._deck[0].symbol() in view
+    assert "p1: 0, p2: 0" in view
+
+
+def test_reset(controller):
+    game = controller._game
+    player = game.whose_turn()
+    controller.play(player, "1A")
+
+    controller.reset()
+
+    assert controller._game is game
+    assert len(game.peek()) == 3
+    view = json.loads(controller.initial_views()[_player1])
+    assert view["t"] == "start"
+    assert view["turn"] == game.whose_turn()
+    assert "1 . . . " in controller.spectator_view()
+
+
+def test_resync_view(controller):
+    player = controller._game.whose_turn()
+    controller.play(player, "1A")
+    symbol = controller._game._deck[0].symbol()
+
+    view = json.loads(controller.resync_view(_player1))
+    text_view = controller.resync_view(_player2)
+
+    assert view["t"] == "sync"
+    assert view["deck"] == [symbol, ".", ".", ".", ".", "."]
+    assert view["scores"] == [0, 0]
+    assert view["turn"] == player
+    assert text_view.startswith("  A B C \n1 %s . . " % symbol)
+    assert "p1: 0, p2: 0" in text_view
+
+
+def test_game_over_result(controller):
+    player = controller._game.whose_turn()
+    for (i, j) in controller._game.peek()[:2]:
+        controller.play(player, "%d%s" % (i // 3 + 1, "ABC"[i % 3]))
+        views = controller.play(player, "%d%s" % (j // 3 + 1, "ABC"[j % 3]))
+
+    scores = (2, 0) if player == _player1 else (0, 2)
+    assert views[RESULT_KEY] == (player,) + scores
+
+
+def test_odd_number_of_cells():
+    with pytest.raises(ValueError):
+        GameController(1, 5, _player1, _player2)
+
+
+def test_spectator_view_shows_previous_result_after_reset(controller):
+    player = controller._game.whose_turn()
+    for (i, j) in controller._game.peek()[:2]:
+        controller.play(player, "%d%s" % (i // 3 + 1, "ABC"[i % 3]))
+        controller.play(player, "%d%s" % (j // 3 + 1, "ABC"[j % 3]))
+
+    controller.reset()
+
+    assert "Previous game... %s won!" % player in controller.spectator_view()
+    player = controller._game.whose_turn()
+    (i, j) = controller._game.peek()[0]
+    controller.play(player, "%d%s" % (i // 3 + 1, "ABC"[i % 3]))
+    assert "Previous game" not in controller.spectator_view()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3.7
+
+"""Differential fuzzing of game engines against the reference game.
+
+Generates random and adversarial move sequences, plays them on the reference
+implementation and on a candidate implementation, and checks that both
+return the same results, raise the same errors and render the same views.
+
+There are two levels. On the game level, the candidate must be a drop-in
+replacement of game.Game. On the controller level, it must be a drop-in
+replacement of game_controller.GameController, and views are compared as
+well. Sequences contain valid moves, moves which match symbols to finish
+games, random cells, out-of-turn moves, moves of unknown players, cells out
+of the deck, malformed cell labels and replays of turned or open cells.
+
+Both implementations are created with the same seed of the random module,
+hence candidates must shuffle their decks with the random module in the same
+order as the reference implementation.
+
+Each sequence is identified by its seed, so a failing sequence can be
+replayed with --seed.
+
+# Run:
+python3 game_fuzz.py [-h] [--candidate [CANDIDATE]] [--level {game,controller}]
+                     [--sequences [SEQUENCES]] [--seed [SEED]]
+                     [--max-moves [MAX_MOVES]] [--workers [WORKERS]]
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import random
+import string
+import sys
+import time
+import game
+import game_controller
+
+
+GAME_LEVEL = "game"
+CONTROLLER_LEVEL = "controller"
+LEVELS = (GAME_LEVEL, CONTROLLER_LEVEL)
+
+_PLAYER1 = "p1"
+_PLAYER2 = "p2"
+_INTRUDER = "p3"
+_MALFORMED_CELLS = ("", "1", "1A1", "0A", "A1", "11", "AA", "1@", "1[", "1`", "1{", " 1A", "\x00\x00")
+_DEFAULT_MAX_MOVES = 200
+_DEFAULT_NUM_SEQUENCES = 10000
+_CHUNK_SIZE = 1000
+
+
+class Mismatch(Exception):
+    """Raised when the candidate and the reference behave differently"""
+
+    def __init__(self, seed, step, what, expected, actual):
+        super().__init__("seed: %d, step: %d, %s: expected %r, got %r" % (seed, step, what, expected, actual))
+        self.seed = seed
+        self.step = step
+
+
+def load_class(spec):
+    """Loads the class from a "module:Class" spec"""
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _call(func, *args):
+    try:
+        return func(*args)
+    except Exception as e:
+        return type(e)
+
+
+class _Sequence:
+    def __init__(self, seed, level, candidate, max_moves):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.level = level
+        self.max_moves = max_moves
+        self.step = 0
+        self.moves = 0
+        # cells played so far, some of which are turned or open
+        self.played = []
+        if level == GAME_LEVEL:
+            num_symbols = self.rng.randint(2, len(string.ascii_lowercase))
+            symbols = "".join(self.rng.sample(string.ascii_lowercase, num_symbols))
+            self.num_cells = num_symbols * 2
+            args = (symbols, _PLAYER1, _PLAYER2)
+            reference_class = game.Game
+        else:
+            (self.num_rows, self.num_cols) = self._pick_grid()
+            self.num_cells = self.num_rows * self.num_cols
+            args = (self.num_rows, self.num_cols, _PLAYER1, _PLAYER2,
+                    {_PLAYER1: game_controller.TEXT_PROTOCOL,
+                     _PLAYER2: self.rng.choice((game_controller.TEXT_PROTOCOL, game_controller.JSON_PROTOCOL))})
+            reference_class = game_controller.GameController
+        random.seed(seed)
+        self.reference = reference_class(*args)
+        random.seed(seed)
+        self.candidate = candidate(*args)
+
+    def run(self):
+        if self.level == CONTROLLER_LEVEL:
+            self._check("initial views", _call(self.reference.initial_views), _call(self.candidate.initial_views))
+        while self.moves < self.max_moves:
+            if self._whose_turn() is None:
+                if self.level == GAME_LEVEL or self.rng.random() < 0.5:
+                    return
+                self._reset()
+            self._play_step()
+        self._check_views()
+
+    def _pick_grid(self):
+        while True:
+            num_rows = self.rng.randint(1, 9)
+            num_cols = self.rng.randint(1, 26)
+            if num_rows * num_cols <= 52 and num_rows * num_cols % 2 == 0 and num_rows * num_cols // 2 > 1:
+                return num_rows, num_cols
+
+    def _reference_game(self):
+        return self.reference if self.level == GAME_LEVEL else self.reference._game
+
+    def _whose_turn(self):
+        return self._reference_game().whose_turn()
+
+    def _reset(self):
+        random.seed(self.seed + self.moves)
+        self.reference.reset()
+        random.seed(self.seed + self.moves)
+        self.candidate.reset()
+        self._check("initial views after reset",
+                    _call(self.reference.initial_views), _call(self.candidate.initial_views))
+
+    def _play_step(self):
+        turn = self._whose_turn()
+        other = _PLAYER1 if turn == _PLAYER2 else _PLAYER2
+        kind = self.rng.random()
+        if kind < 0.3:
+            # play a pair of the same symbol, which finishes games
+            pairs = [p for p in self._reference_game().peek() if isinstance(p, tuple)]
+            if pairs:
+                pair = self.rng.choice(pairs)
+                self._play(turn, pair[0])
+                self._play(turn, pair[1])
+                return
+            self._play(turn, self.rng.randrange(self.num_cells))
+        elif kind < 0.6:
+            self._play(turn, self.rng.randrange(self.num_cells))
+        elif kind < 0.7:
+            self._play(other, self.rng.randrange(self.num_cells))
+        elif kind < 0.75:
+            self._play(_INTRUDER, self.rng.randrange(self.num_cells))
+        elif kind < 0.85:
+            # cells out of the deck
+            self._play(turn, self.rng.choice((-1, self.num_cells, self.num_cells + self.rng.randint(1, 100),
+                                              -self.rng.randint(2, 100), 52, 9 * 26)))
+        elif kind < 0.95:
+            # replays of turned or open cells
+            self._play(turn, self.rng.choice(self.played[-8:]) if self.played else 0)
+        elif self.level == CONTROLLER_LEVEL:
+            self._play_cell(turn, self.rng.choice(_MALFORMED_CELLS))
+        else:
+            self._play(turn, self.rng.randrange(self.num_cells))
+
+    def _play(self, player, index):
+        self.played.append(index)
+        if self.level == GAME_LEVEL:
+            self.step += 1
+            self.moves += 1
+            self._check("play(%s, %d)" % (player, index),
+                        _call(self.reference.play, player, index), _call(self.candidate.play, player, index))
+            self._check("whose_turn", self.reference.whose_turn(), self.candidate.whose_turn())
+        elif 0 <= index < 9 * 26:
+            self._play_cell(player, "%s%s" % (index // self.num_cols + 1, string.ascii_uppercase[index % self.num_cols]))
+        else:
+            self._play_cell(player, str(index))
+
+    def _play_cell(self, player, cell):
+        self.step += 1
+        self.moves += 1
+        self._check("play(%s, %r)" % (player, cell),
+                    _call(self.reference.play, player, cell), _call(self.candidate.play, player, cell))
+        if self.rng.random() < 0.05:
+            self._check_views()
+
+    def _check_views(self):
+        if self.level == GAME_LEVEL:
+            self._check("peek", _call(self.reference.peek), _call(self.candidate.peek))
+            return
+        self._check("spectator view", _call(self.reference.spectator_view), _call(self.candidate.spectator_view))
+        for player in (_PLAYER1, _PLAYER2):
+            self._check("resync view of %s" % player,
+                        _call(self.reference.resync_view, player), _call(self.candidate.resync_view, player))
+
+    def _check(self, what, expected, actual):
+        if expected != actual:
+            raise Mismatch(self.seed, self.step, what, expected, actual)
+
+
+def run_sequence(seed, level=CONTROLLER_LEVEL, candidate=None, max_moves=_DEFAULT_MAX_MOVES):
+    """Runs the sequence of the given seed and returns the number of moves.
+
+    candidate is the class to check, the reference class by default. Raises
+    Mismatch if the candidate behaves differently than the reference.
+    """
+    if candidate is None:
+        candidate = game.Game if level == GAME_LEVEL else game_controller.GameController
+    sequence = _Sequence(seed, level, candidate, max_moves)
+    sequence.run()
+    return sequence.moves
+
+
+def _run_chunk(args):
+    (first_seed, count, level, candidate_spec, max_moves) = args
+    candidate = load_class(candidate_spec) if candidate_spec else None
+    moves = 0
+    for seed in range(first_seed, first_seed + count):
+        try:
+            moves += run_sequence(seed, level, candidate, max_moves)
+        except Mismatch as e:
+            return moves, str(e)
+    return moves, None
+
+
+def run_campaign(first_seed, num_sequences, level=CONTROLLER_LEVEL, candidate_spec=None,
+                 max_moves=_DEFAULT_MAX_MOVES, workers=1):
+    """Runs the sequences of consecutive seeds on the given number of processes.
+
+    Returns the number of moves played and the first mismatch found, if any.
+    """
+    chunks = []
+    for seed in range(first_seed, first_seed + num_sequences, _CHUNK_SIZE):
+        chunks.append((seed, min(_CHUNK_SIZE, first_seed + num_sequences - seed),
+                       level, candidate_spec, max_moves))
+    total_moves = 0
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            for (moves, mismatch) in pool.imap_unordered(_run_chunk, chunks):
+                total_moves += moves
+                if mismatch:
+                    pool.terminate()
+                    return total_moves, mismatch
+    else:
+        for chunk in chunks:
+            (moves, mismatch) = _run_chunk(chunk)
+            total_moves += moves
+            if mismatch:
+                return total_moves, mismatch
+    return total_moves, None
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Checks a candidate game implementation against the reference one.')
+    parser.add_argument("--candidate", dest="candidate", nargs='?', default=None,
+                        help="candidate class as module:Class, the reference class by default")
+    parser.add_argument("--level", dest="level", choices=LEVELS, default=CONTROLLER_LEVEL,
+                        help="compare game.Game or game_controller.GameController replacements")
+    parser.add_argument("--sequences", dest="sequences", type=int, nargs='?', default=_DEFAULT_NUM_SEQUENCES,
+                        help="number of sequences to run")
+    parser.add_argument("--seed", dest="seed", type=int, nargs='?', default=0,
+                        help="seed of the first sequence")
+    parser.add_argument("--max-moves", dest="max_moves", type=int, nargs='?', default=_DEFAULT_MAX_MOVES,
+                        help="maximum number of moves in a sequence")
+    parser.add_argument("--workers", dest="workers", type=int, nargs='?', default=multiprocessing.cpu_count(),
+                        help="number of processes")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    moves, mismatch = run_campaign(args.seed, args.sequences, args.level, args.candidate,
+                                   args.max_moves, args.workers)
+    elapsed = time.perf_counter() - started
+    print("%d sequences, %d moves in %.1f seconds: %.0f sequences/s, %.0f moves/s" % (
+        args.sequences, moves, elapsed, args.sequences / elapsed, moves / elapsed))
+    if mismatch:
+        print("mismatch: %s" % (mismatch))
+        sys.exit(1)
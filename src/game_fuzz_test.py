@@ -0,0 +1,45 @@
+import pytest
+import game
+import game_controller
+from game_fuzz import run_sequence, run_campaign, Mismatch, GAME_LEVEL, CONTROLLER_LEVEL
+
+
+class _MiscountingGame(game.Game):
+    def _increment_score(self):
+        if self._score1 + self._score2 == 2:
+            # forgets to count the third match
+            return 0
+        return super()._increment_score()
+
+
+class _SloppyController(game_controller.GameController):
+    def spectator_view(self):
+        return super().spectator_view().upper()
+
+
+def test_reference_matches_itself():
+    moves, mismatch = run_campaign(0, 50, GAME_LEVEL)
+    assert moves > 0
+    assert not mismatch
+
+    moves, mismatch = run_campaign(0, 50, CONTROLLER_LEVEL)
+    assert moves > 0
+    assert not mismatch
+
+
+def test_game_mismatch_is_found():
+    with pytest.raises(Mismatch):
+        for seed in range(0, 100):
+            run_sequence(seed, GAME_LEVEL, _MiscountingGame)
+
+
+def test_controller_mismatch_is_found():
+    with pytest.raises(Mismatch):
+        for seed in range(0, 100):
+            run_sequence(seed, CONTROLLER_LEVEL, _SloppyController)
+
+
+def test_campaign_reports_mismatch():
+    moves, mismatch = run_campaign(0, 100, CONTROLLER_LEVEL, "game_fuzz_test:_SloppyController")
+
+    assert "spectator view" in mismatch
@@ -0,0 +1,157 @@
+import bisect
+import sqlite3
+import threading
+import time
+
+
+GAMES = 0
+WINS = 1
+TIES = 2
+
+
+class ResultsStore:
+    """Keeps the results of finished games and the standings of players.
+
+    Standings are updated as results are recorded, so querying the standing
+    of a player does not scan the history. Players are also kept ranked by
+    their wins and ties, so the leaderboard is not sorted for each query. When a database path is given,
+    recorded results are also buffered in memory and written to a SQLite
+    database in batches with write_batch(), which blocks and hence should be
+    called off the event loop. The database keeps the standings in a table
+    of their own as well, which is updated in the same transaction as the
+    results, so only the standings are loaded when the store is created.
+    """
+
+    def __init__(self, path=None, batch_size=100):
+        """Initializes the store with the given SQLite database path.
+
+        Results are only kept in memory if no path is given. batch_size is
+        the number of buffered results after which the store should be
+        flushed. See is_batch_ready().
+        """
+        if batch_size < 1:
+            raise ValueError
+        self._batch_size = batch_size
+        self._buffer = []
+        # batches which are taken but not written yet, by their ids
+        self._pending = {}
+        self._standings = {}
+        # (-wins, -ties, player) tuples of all players, best first
+        self._ranking = []
+        self._db = None
+        self._lock = threading.Lock()
+        if path:
+            # batches are written by other threads, one at a time
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db:
+                self._create_tables()
+            for (player, games, wins, ties) in self._db.execute(
+                    "SELECT player, games, wins, ties FROM standings"):
+                self._standings[player] = [games, wins, ties]
+            self._ranking = sorted(_rank_key(player, standing) for (player, standing) in self._standings.items())
+
+    def record(self, player1, player2, winner, score1, score2):
+        """Records the result of a finished game.
+
+        winner is either one of the players, or None if the game is a tie.
+        """
+        players = {player1, player2}
+        for player in players:
+            standing = self._standings.get(player)
+            if standing:
+                del self._ranking[bisect.bisect_left(self._ranking, _rank_key(player, standing))]
+        _add_result(self._standings, player1, player2, winner)
+        for player in players:
+            bisect.insort(self._ranking, _rank_key(player, self._standings[player]))
+        if self._db:
+            self._buffer.append((time.time(), player1, player2, winner, score1, score2))
+
+    def standing(self, player):
+        """Returns a tuple of the numbers of games, wins and ties of the player.
+
+        The values are at the GAMES, WINS and TIES indices respectively.
+        """
+        return tuple(self._standings.get(player, (0, 0, 0)))
+
+    def leaderboard(self, count):
+        """Returns the given number of players with the most wins, then the
+        most ties, along with their standings"""
+        return [(player, self.standing(player)) for (_, _, player) in self._ranking[0:count]]
+
+    def is_batch_ready(self):
+        """Returns True if there are enough buffered results to write"""
+        return len(self._buffer) >= self._batch_size
+
+    def take_batch(self):
+        """Returns the buffered results and empties the buffer.
+
+        The batch is kept until it is written with write_batch(), so that
+        close() writes it if it is never written otherwise.
+        """
+        batch = self._buffer
+        self._buffer = []
+        if batch:
+            self._pending[id(batch)] = batch
+        return batch
+
+    def write_batch(self, batch):
+        """Writes the given results, taken with take_batch(), to the database.
+
+        It does nothing if the batch is already written by close().
+        """
+        with self._lock:
+            if self._pending.pop(id(batch), None) is not None:
+                self._write(batch)
+
+    def flush(self):
+        """Writes all buffered results to the database"""
+        self.write_batch(self.take_batch())
+
+    def close(self):
+        """Writes the buffered results and the batches which are not written
+        yet, and closes the database"""
+        self.take_batch()
+        # a batch may still be written by another thread
+        with self._lock:
+            if not self._db:
+                return
+            for batch in list(self._pending.values()):
+                self._write(batch)
+            self._pending.clear()
+            self._db.close()
+            self._db = None
+
+    def _write(self, batch):
+        # games, wins and ties added by the batch for each player
+        changes = {}
+        for (_, player1, player2, winner, _, _) in batch:
+            _add_result(changes, player1, player2, winner)
+        with self._db:
+            self._db.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)", batch)
+            self._db.executemany("INSERT OR IGNORE INTO standings VALUES (?, 0, 0, 0)",
+                                 [(player,) for player in changes])
+            self._db.executemany(
+                "UPDATE standings SET games = games + ?, wins = wins + ?, ties = ties + ? "
+                "WHERE player = ?", [tuple(change) + (player,) for (player, change) in changes.items()])
+
+    def _create_tables(self):
+        self._db.execute("CREATE TABLE IF NOT EXISTS results (finished_at REAL, player1 TEXT, "
+                         "player2 TEXT, winner TEXT, score1 INTEGER, score2 INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS standings (player TEXT PRIMARY KEY, games INTEGER, "
+                         "wins INTEGER, ties INTEGER)")
+
+
+def _rank_key(player, standing):
+    return -standing[WINS], -standing[TIES], player
+
+
+def _add_result(standings, player1, player2, winner):
+    for player in (player1, player2):
+        standing = standings.get(player)
+        if not standing:
+            standing = standings[player] = [0, 0, 0]
+        standing[GAMES] += 1
+        if not winner:
+            standing[TIES] += 1
+        elif winner == player:
+            standing[WINS] += 1
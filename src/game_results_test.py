@@ -0,0 +1,148 @@
+import sqlite3
+import threading
+import pytest
+from game_results import ResultsStore, GAMES, WINS, TIES
+
+
+_player1 = "p1"
+_player2 = "p2"
+_player3 = "p3"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.db"), batch_size=2)
+    yield store
+    store.close()
+
+
+def test_standings(store):
+    store.record(_player1, _player2, _player1, 3, 1)
+    store.record(_player1, _player3, None, 2, 2)
+
+    assert store.standing(_player1) == (2, 1, 1)
+    assert store.standing(_player2) == (1, 0, 0)
+    assert store.standing(_player3)[TIES] == 1
+    assert store.standing("unknown") == (0, 0, 0)
+
+
+def test_batches(store):
+    store.record(_player1, _player2, _player1, 3, 1)
+    assert not store.is_batch_ready()
+
+    store.record(_player1, _player2, _player2, 1, 3)
+    assert store.is_batch_ready()
+
+    batch = store.take_batch()
+    assert len(batch) == 2
+    assert not store.is_batch_ready()
+    store.write_batch(batch)
+
+
+def test_standings_are_loaded_from_database(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = ResultsStore(path)
+    store.record(_player1, _player2, _player1, 3, 1)
+    store.record(_player1, _player2, None, 2, 2)
+    store.close()
+
+    store = ResultsStore(path)
+
+    assert store.standing(_player1)[GAMES] == 2
+    assert store.standing(_player1)[WINS] == 1
+    assert store.standing(_player2) == (2, 0, 1)
+    store.close()
+
+
+def test_results_in_memory():
+    store = ResultsStore()
+    store.record(_player1, _player2, _player1, 3, 1)
+
+    assert store.standing(_player1) == (1, 1, 0)
+    assert not store.take_batch()
+
+
+def test_invalid_batch_size():
+    with pytest.raises(ValueError):
+        ResultsStore(batch_size=0)
+
+
+def test_standings_are_loaded_without_results(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = ResultsStore(path)
+    store.record(_player1, _player2, _player1, 3, 1)
+    store.close()
+    db = sqlite3.connect(path)
+    with db:
+        db.execute("DELETE FROM results")
+    db.close()
+
+    store = ResultsStore(path)
+
+    assert store.standing(_player1) == (1, 1, 0)
+    store.close()
+
+
+def test_leaderboard(store):
+    store.record(_player1, _player2, _player1, 3, 1)
+    store.record(_player2, _player3, None, 2, 2)
+    store.record(_player3, _player1, _player3, 3, 1)
+    store.record(_player3, _player2, _player3, 3, 1)
+
+    assert store.leaderboard(2) == [(_player3, (3, 2, 1)), (_player1, (2, 1, 0))]
+    assert [player for (player, _) in store.leaderboard(10)] == [_player3, _player1, _player2]
+
+
+def test_leaderboard_is_loaded_from_database(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = ResultsStore(path)
+    store.record(_player1, _player2, _player2, 1, 3)
+    store.close()
+
+    store = ResultsStore(path)
+    store.record(_player1, _player3, _player1, 3, 1)
+
+    assert store.leaderboard(3) == [(_player1, (2, 1, 0)), (_player2, (1, 1, 0)), (_player3, (1, 0, 0))]
+    store.close()
+
+
+def _count_results(path):
+    db = sqlite3.connect(path)
+    (count,) = db.execute("SELECT COUNT(*) FROM results").fetchone()
+    db.close()
+    return count
+
+
+def test_close_waits_for_batch_writes(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = ResultsStore(path)
+    store.record(_player1, _player2, _player1, 3, 1)
+    batch = store.take_batch()
+
+    store._lock.acquire()
+    closer = threading.Thread(target=store.close)
+    closer.start()
+    closer.join(0.1)
+    assert closer.is_alive()
+    store._lock.release()
+    closer.join()
+
+    # the batch is written by close(), so it is not written twice
+    store.write_batch(batch)
+    assert _count_results(path) == 1
+
+
+def test_close_writes_taken_batches(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = ResultsStore(path)
+    store.record(_player1, _player2, _player1, 3, 1)
+    # the task which took the batch is cancelled before writing it
+    store.take_batch()
+    store.record(_player1, _player2, None, 2, 2)
+
+    store.close()
+
+    assert _count_results(path) == 2
+    store = ResultsStore(path)
+    assert store.standing(_player1) == (2, 1, 1)
+    store.close()
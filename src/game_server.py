@@ -5,7 +5,8 @@ the game with a telnet client.
 
 # Dependencies:
 
-- curio
+- curio, unless the server runs with the asyncio backend
+- uvloop, optionally, to run the asyncio backend on uvloop
 
 Contribute: https://github.com/metanet/match-letters-game
 
@@ -16,7 +17,12 @@ pip -r requirements.txt
 
 # Run:
 python3 game.server.py [-h] [--host [HOST]] [--port [PORT]] [--rows [ROWS]]
-                       [--cols [COLS]]
+                       [--cols [COLS]] [--backend {curio,asyncio}]
+                       [--loop {asyncio,uvloop}] [--log-level [LOG_LEVEL]]
+                       [--reconnect-grace [RECONNECT_GRACE]]
+                       [--results-db [RESULTS_DB]] [--trace]
+                       [--trace-slow-ms [TRACE_SLOW_MS]]
+                       [--workers [WORKERS]]
 
 Optional arguments:
   -h, --help     show this help message and exit
@@ -24,6 +30,23 @@ Optional arguments:
   --port [PORT]  port to bind
   --rows [ROWS]  number of rows in the game deck
   --cols [COLS]  number of cols in the game deck
+  --backend {curio,asyncio}
+                 event loop backend of the server
+  --loop {asyncio,uvloop}
+                 event loop implementation of the asyncio backend
+  --log-level [LOG_LEVEL]
+                 logging level, such as INFO or WARNING
+  --reconnect-grace [RECONNECT_GRACE]
+                 seconds to keep the game of a disconnected player
+  --results-db [RESULTS_DB]
+                 SQLite database to store the game results in
+  --trace        trace the latency of moves and log it periodically
+  --trace-slow-ms [TRACE_SLOW_MS]
+                 log the moves slower than the given milliseconds, implies
+                 --trace
+  --workers [WORKERS]
+                 number of workers to run the games on, 0 to run them on
+                 the event loop
 
 # How to play:
 You can connect to the game server with a telnet client. For instance, if
@@ -32,27 +55,89 @@ telnet localhost 10670. The game server supports arbitrary number of players.
 Since the game is for 2 players, the game server pairs connecting players
 in the FIFO order. When a player joins the server, she will wait in the lobby
 until another player chimes in. When a player disconnects during the game, the
-other player returns back to the lobby. If you want to disconnect your telnet
-client, you can hit "CTRL+]", then type "close".
+other player waits for it to reconnect for a grace period, and then returns
+back to the lobby. See "Reconnecting" below. If you want to disconnect your
+telnet client, you can hit "CTRL+]", then type "close".
+
+# Machine clients:
+Bots can send "@json <name>" instead of their name to switch to a compact
+JSON lines protocol. The first line they receive is the name prompt and
+must be skipped. Each following line is a JSON object whose "t" field is one
+of "info", "start", "move", "error" or "over". Moves are sent as cell
+labels, such as 1A, same as the telnet clients. "move" lines carry only the
+cells changed since the previous move as [index, label] pairs, along with
+the scores and the player who will play next.
+
+# Spectators:
+Clients can send "@watch <name>" instead of their name to watch the game of
+the given player, or just "@watch" to watch the most recently started game.
+
+# Rooms:
+Players can prefix their name with "@room <room> " to be paired only with
+the players of the same room, such as "@room final @json alice". Players
+without a room are paired in the FIFO order as usual. Tournaments use rooms
+to play their scheduled pairings. See tournament.py.
+
+# Reconnecting:
+Each player gets a session token when it joins. When a player disconnects
+during a game, the game is kept for a grace period. The player can get back
+into the game by sending "@resume <token>" instead of its name, and then it
+receives the full view of the game. JSON clients receive the token in a
+"session" line and the full view in a "sync" line, and keep using the JSON
+lines protocol after they resume. A player can also resume its session
+while its previous connection is still open, which is then closed. A
+disconnected player is not paired with new players, so its session ends
+once its opponent leaves.
+
+# Results:
+Players see their numbers of games, wins and ties after each game. Results
+are kept in memory, and also written to a SQLite database in batches if the
+server is started with --results-db. Clients can send "@top" instead of
+their name to see the players with the most wins.
+
+# Workers:
+Games run on the event loop by default. Large decks take longer to render,
+which delays the I/O of all players. With --workers, games are spread over
+a pool of workers, which are threads on free-threaded Python builds and
+processes otherwise. Each game stays on one worker, so its moves are played
+in order, and the event loop only passes moves to the workers and the
+rendered views back to the players.
 """
 
 import logging
+import secrets
 import string
+import time
 import argparse
-import curio
 import game_controller
+import game_results
+import game_tracing
+import game_workers
+import server_backend
 
 
 class _Player:
-    def __init__(self, player_name, client, client_stream):
+    def __init__(self, player_name, client_stream, protocol=game_controller.TEXT_PROTOCOL, room=None):
         self.name = player_name
-        self.client = client
         self.stream = client_stream
-        self.queue = curio.Queue()
+        self.protocol = protocol
+        self.room = room
+        self.queue = _backend.Queue()
         self.active = True
+        self.token = secrets.token_urlsafe(12)
+        self.randezvous = None
+        # set once the player has left for good
+        self.gone = _backend.Event()
+        # set when the player reconnects after its stream is lost
+        self.reconnected = _backend.Event()
+        # whether the stream is lost and the player may still reconnect
+        self.disconnected = False
 
-    async def enqueue_message(self, message):
-        await self.queue.put(message)
+    async def enqueue_message(self, message, trace=None):
+        await self.queue.put((message, trace))
+
+    async def enqueue_notice(self, text):
+        await self.queue.put((game_controller.format_notice(self.protocol, text), None))
 
     async def dequeue_message(self):
         message = await self.queue.get()
@@ -61,6 +146,10 @@ class _Player:
     async def write_message(self, message):
         await _do_write_message(self.stream, message)
 
+    async def clear_messages(self):
+        while not self.queue.empty():
+            await self.queue.get()
+
     def set_inactive(self):
         self.active = False
 
@@ -68,12 +157,54 @@ class _Player:
         return self.active
 
 
+class _Broadcast:
+    """Shares the latest spectator frame of a game with all of its spectators.
+
+    Each frame is encoded only once and the same bytes object is written to
+    every spectator. Spectators do not have their own queues. They wait for
+    the version of the frame to change and always pick the latest frame, so
+    slow spectators skip the frames they missed.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.version = 0
+        self.closed = False
+        self.num_spectators = 0
+        self._event = _backend.Event()
+
+    async def publish(self, frame):
+        self.frame = frame
+        await self._notify()
+
+    def invalidate(self):
+        self.frame = None
+        self.version += 1
+
+    async def close(self):
+        self.closed = True
+        await self._notify()
+
+    async def next_frame(self, version):
+        while self.version == version and not self.closed:
+            await self._event.wait()
+        return self.version, self.frame
+
+    async def _notify(self):
+        self.version += 1
+        event = self._event
+        self._event = _backend.Event()
+        await event.set()
+
+
 class _Randezvous:
     def __init__(self):
         self.player1 = None
         self.player2 = None
-        self.game_queue = curio.Queue()
-        self.task_group = curio.TaskGroup(wait=any)
+        self.game = None
+        self.broadcast = _Broadcast()
+        self.game_queue = _backend.Queue()
+        self.task_group = _backend.TaskGroup()
 
     def add_player(self, player):
         if not self.player1:
@@ -103,13 +234,62 @@ class _Randezvous:
         self.reset_game()
 
     def reset_game(self):
-        self.game_queue = curio.Queue()
-        self.task_group = curio.TaskGroup(wait=any)
+        self.game = None
+        self.broadcast = _Broadcast()
+        self.game_queue = _backend.Queue()
+        self.task_group = _backend.TaskGroup()
 
 
 class _Lobby:
     def __init__(self):
         self.randezvous = _Randezvous()
+        # room names to the randezvous of the players waiting in them
+        self.rooms = {}
+        # player names to the randezvous of their ongoing games
+        self.games = {}
+        # session tokens to players
+        self.sessions = {}
+        # the randezvous may be reset before its game is unregistered,
+        # so the player names are kept here as well
+        self.game_players = {}
+        self.last_game = None
+
+    def waiting_randezvous(self, room):
+        """Returns the randezvous which the next player of the room joins"""
+        if not room:
+            return self.randezvous
+        randezvous = self.rooms.get(room)
+        if not randezvous:
+            randezvous = _Randezvous()
+            self.rooms[room] = randezvous
+        return randezvous
+
+    def close_randezvous(self, room, randezvous):
+        """Makes the next players of the room join a new randezvous"""
+        if not room:
+            if self.randezvous == randezvous:
+                self.randezvous = _Randezvous()
+        elif self.rooms.get(room) == randezvous:
+            del self.rooms[room]
+
+    def register_game(self, randezvous):
+        players = (randezvous.player1.name, randezvous.player2.name)
+        for player_name in players:
+            self.games[player_name] = randezvous
+        self.game_players[randezvous] = players
+        self.last_game = randezvous
+
+    def unregister_game(self, randezvous):
+        for player_name in self.game_players.pop(randezvous, ()):
+            if self.games.get(player_name) == randezvous:
+                del self.games[player_name]
+        if self.last_game == randezvous:
+            self.last_game = None
+
+    def find_game(self, player_name):
+        if player_name:
+            return self.games.get(player_name)
+        return self.last_game
 
 
 _DEFAULT_HOST = "localhost"
@@ -118,10 +298,40 @@ _DEFAULT_NUM_ROWS = 4
 _DEFAULT_NUM_COLS = 6
 
 
-_lobby = _Lobby()
+_backend = None
+_lobby = None
+_results = None
+_results_ready = None
+_tracer = None
+_game_pool = None
 _START_GAME = -1
+_RESYNC = -2
+# clients select the JSON lines protocol by sending "@json <name>"
+# instead of their name.
+_JSON_HELLO = "@json "
+# players send "@room <room> <name>" to be paired in the given room.
+# the name may be any of the hellos of the players.
+_ROOM_HELLO = "@room "
+# spectators send "@watch [<player name>]" instead of their name.
+_WATCH_HELLO = "@watch"
+_WATCH_MODE = "watch"
+# players send "@resume <token>" instead of their name to reconnect.
+_RESUME_HELLO = "@resume "
+_RESUME_MODE = "resume"
+# clients send "@top" instead of their name to see the leaderboard.
+_TOP_HELLO = "@top"
+_TOP_MODE = "top"
+_LEADERBOARD_SIZE = 10
 _NUM_ROWS = _DEFAULT_NUM_ROWS
 _NUM_COLS = _DEFAULT_NUM_COLS
+_DEFAULT_RECONNECT_GRACE = 30
+_RECONNECT_GRACE = _DEFAULT_RECONNECT_GRACE
+_RESULTS_DB = None
+_RESULTS_FLUSH_INTERVAL = 5
+_TRACE = False
+_TRACE_SLOW_MS = None
+_TRACE_REPORT_INTERVAL = 10
+_WORKERS = 0
 
 
 async def _do_write_message(client_stream, message):
@@ -134,23 +344,154 @@ def _decode_message(message):
 
 async def _player_outbound(player):
     while True:
-        message = await player.dequeue_message()
-        await player.write_message(message)
+        (message, trace) = await player.dequeue_message()
+        if trace:
+            dequeued = time.perf_counter_ns()
+        try:
+            await player.write_message(message)
+        except OSError:
+            # the stream is lost. the player either reconnects and gets the
+            # full view of the game, or leaves, so the message is dropped.
+            continue
+        if trace:
+            _tracer.record_delivery(trace, dequeued, player.name)
 
 
-async def _player_inbound(player, game_queue):
-    async for message in player.stream:
-        try:
-            decoded = _decode_message(message)
-            await game_queue.put((player, decoded))
-        except Exception as e:
-            logging.getLogger(player.name).error(
-                "decoding of %s's message: %d failed with: %s", player.name, message, e)
-            break
+async def _player_presence(player):
+    await player.gone.wait()
+
+
+async def _player_inbound(player, client_stream):
+    """Sends the moves read from the given stream of the player to its game.
+
+    Returns once the stream is closed. If the player is in a game, it is kept
+    in the game until it reconnects or the reconnect grace period is over.
+    """
+    try:
+        async for message in client_stream:
+            if player.stream is not client_stream:
+                # the player has resumed its session with a new stream
+                return
+            trace = _tracer.start(player.name) if _tracer else None
+            try:
+                decoded = _decode_message(message)
+                if trace:
+                    trace.mark_decoded()
+                if player.randezvous:
+                    await player.randezvous.game_queue.put((player, decoded, trace))
+            except Exception as e:
+                logging.getLogger(player.name).error(
+                    "decoding of %s's message: %s failed with: %s", player.name, message, e)
+                break
+    except ConnectionError:
+        # same as a closed connection
+        pass
+
+    if player.stream is not client_stream:
+        # the player has already reconnected with a new stream
+        return
+
+    randezvous = player.randezvous
+    if _RECONNECT_GRACE > 0 and randezvous and randezvous.is_full() and player.is_active():
+        logging.getLogger("lobby").info("%s is disconnected. waiting for %g seconds to reconnect...",
+                                        player.name, _RECONNECT_GRACE)
+        await _notify_opponent(randezvous, player, f"\n%s is disconnected. Waiting for %s to reconnect...\n" %
+                               (player.name, player.name))
+        player.reconnected = _backend.Event()
+        player.disconnected = True
+        if await _backend.wait_event(player.reconnected, _RECONNECT_GRACE):
+            return
+
     player.set_inactive()
+    await player.gone.set()
+
+
+async def _notify_opponent(randezvous, player, text):
+    opponent = randezvous.get_opponent(player)
+    await opponent.enqueue_notice(text)
+    if opponent.protocol == game_controller.TEXT_PROTOCOL:
+        # the notice shifts the board of the text client, which is redrawn
+        # in place after each move. so the full view is shown again.
+        await randezvous.game_queue.put((opponent, _RESYNC, None))
+
+
+async def _publish_spectator_view(randezvous, frame=None):
+    broadcast = randezvous.broadcast
+    if broadcast.num_spectators:
+        # render and encode once, no matter how many spectators are watching.
+        # the frame may be rendered along with the move already.
+        if not frame:
+            frame = await randezvous.game.spectator_frame()
+        await broadcast.publish(frame)
+    else:
+        broadcast.invalidate()
+
+
+async def _record_result(randezvous, result):
+    (winner, score1, score2) = result
+    _results.record(randezvous.player1.name, randezvous.player2.name, winner, score1, score2)
+    if _results.is_batch_ready():
+        await _results_ready.set()
+    for player in (randezvous.player1, randezvous.player2):
+        standing = _results.standing(player.name)
+        await player.enqueue_notice(f"%s: %d games, %d wins, %d ties\n" % (
+            player.name, standing[game_results.GAMES], standing[game_results.WINS],
+            standing[game_results.TIES]))
+
+
+async def _flush_results():
+    global _results_ready
+    while True:
+        await _backend.wait_event(_results_ready, _RESULTS_FLUSH_INTERVAL)
+        _results_ready = _backend.Event()
+        batch = _results.take_batch()
+        if batch:
+            # writing to the database blocks, so it is done in a thread
+            await _backend.run_in_thread(_results.write_batch, batch)
+
+
+async def _report_traces():
+    logger = logging.getLogger("trace")
+    while True:
+        await _backend.sleep(_TRACE_REPORT_INTERVAL)
+        if _tracer.is_empty():
+            continue
+        # each report covers only the moves of its own interval, so that it
+        # shows which stage is slow at the moment
+        lines = _tracer.summary()
+        _tracer.reset()
+        logger.info("moves of the last %d seconds:", _TRACE_REPORT_INTERVAL)
+        for line in lines:
+            logger.info(line)
+
+
+async def _start_rematch(randezvous):
+    # both players are still here, otherwise this task would be cancelled.
+    # so the game, the I/O tasks and the queues are reused for the next game.
+    logging.getLogger("game").info(f"%s and %s are starting a new game..." %
+                                   (randezvous.player1.name, randezvous.player2.name))
+    (views, frame) = await randezvous.game.reset(randezvous.broadcast.num_spectators > 0)
+    await randezvous.player1.enqueue_notice(f"Starting a new game with %s.\n" % (randezvous.player2.name))
+    await randezvous.player2.enqueue_notice(f"Starting a new game with %s.\n" % (randezvous.player1.name))
+    await randezvous.player1.enqueue_message(views[randezvous.player1.name])
+    await randezvous.player2.enqueue_message(views[randezvous.player2.name])
+    await _publish_spectator_view(randezvous, frame)
 
 
 async def _play_game(randezvous):
+    # the randezvous may get a new broadcast before this task is cancelled
+    broadcast = randezvous.broadcast
+    game = _game_pool.new_game()
+    try:
+        await _do_play_game(randezvous, game)
+    finally:
+        _lobby.unregister_game(randezvous)
+        # spectators are let go first, even if the game fails to close
+        await broadcast.close()
+        game.close()
+
+
+async def _do_play_game(randezvous, pooled_game):
     logger = logging.getLogger("game")
     game = None
 
@@ -159,138 +500,348 @@ async def _play_game(randezvous):
         if message == _START_GAME:
             logger.info(f"Starting the game between %s and %s!" %
                         (randezvous.player1.name, randezvous.player2.name))
-            game = game_controller.GameController(
-                _NUM_ROWS, _NUM_COLS, randezvous.player1.name, randezvous.player2.name)
-            views = game.initial_views()
+            views = await pooled_game.start(
+                _NUM_ROWS, _NUM_COLS, randezvous.player1.name, randezvous.player2.name,
+                {randezvous.player1.name: randezvous.player1.protocol,
+                 randezvous.player2.name: randezvous.player2.protocol})
+            game = pooled_game
+            randezvous.game = game
+            _lobby.register_game(randezvous)
 
             await randezvous.player1.enqueue_message(views[randezvous.player1.name])
             await randezvous.player2.enqueue_message(views[randezvous.player2.name])
+            await _publish_spectator_view(randezvous)
             continue
 
-        (player, move) = message
-        if not game:
-            await player.enqueue_message("The game has not started yet. Still waiting for the second player...\n")
+        (player, move, trace) = message
+        if trace:
+            trace.mark_dequeued()
+        if move == _RESYNC:
+            if game:
+                await player.enqueue_message(await game.resync_view(player.name))
+            else:
+                await player.enqueue_notice("Waiting for the second player...\n")
+            continue
+        elif not game:
+            await player.enqueue_notice("The game has not started yet. Still waiting for the second player...\n")
             continue
 
         logger.info("handling \"%s\" from %s", move, player.name)
 
         try:
-            views = game.play(player.name, move)
+            (views, frame) = await game.play(player.name, move, randezvous.broadcast.num_spectators > 0)
+            if trace:
+                _tracer.record_play(trace)
             if views.get(randezvous.player1.name):
-                await randezvous.player1.enqueue_message(views[randezvous.player1.name])
+                await randezvous.player1.enqueue_message(views[randezvous.player1.name], trace)
             if views.get(randezvous.player2.name):
-                await randezvous.player2.enqueue_message(views[randezvous.player2.name])
+                await randezvous.player2.enqueue_message(views[randezvous.player2.name], trace)
+            if views.get(randezvous.player1.name) and views.get(randezvous.player2.name):
+                # both players see the move, so it is not an invalid input
+                await _publish_spectator_view(randezvous, frame)
             if views[game_controller.GAME_OVER_KEY]:
-                randezvous.reset_game()
-                return
+                await _record_result(randezvous, views[game_controller.RESULT_KEY])
+                await _start_rematch(randezvous)
         except Exception as e:
             logger.error("%s's %s failed with: %s", player.name, move, e)
 
 
 async def _get_player_name(client_stream):
+    """Returns the player name, the protocol selected by the client and the
+    room of the player, which is None for the FIFO pairing.
+
+    For spectators, returns the name of the player to watch, which may be
+    empty, and _WATCH_MODE. For reconnecting players, returns the session
+    token and _RESUME_MODE. For the leaderboard, returns an empty name and
+    _TOP_MODE.
+    """
     while True:
         await _do_write_message(client_stream, "Your name: ")
         player_name = _decode_message(await client_stream.readline())
-        if player_name:
-            return player_name
+        room = None
+        if player_name.startswith(_ROOM_HELLO):
+            (room, _, player_name) = player_name[len(_ROOM_HELLO):].strip().partition(" ")
+            player_name = player_name.strip()
+        if player_name == _WATCH_HELLO or player_name.startswith(_WATCH_HELLO + " "):
+            return player_name[len(_WATCH_HELLO):].strip(), _WATCH_MODE, room
+        elif player_name == _TOP_HELLO:
+            return "", _TOP_MODE, room
+        elif player_name.startswith(_RESUME_HELLO):
+            return player_name[len(_RESUME_HELLO):].strip(), _RESUME_MODE, room
+        elif player_name.startswith(_JSON_HELLO) and player_name[len(_JSON_HELLO):].strip():
+            return player_name[len(_JSON_HELLO):].strip(), game_controller.JSON_PROTOCOL, room
+        elif player_name:
+            return player_name, game_controller.TEXT_PROTOCOL, room
         else:
             await _do_write_message(client_stream, game_controller.RESET_TERMINAL_CODE)
 
 
 async def _start_player_io(randezvous, player):
     await randezvous.task_group.spawn(_player_outbound, player)
-    await randezvous.task_group.spawn(_player_inbound, player, randezvous.game_queue)
+    await randezvous.task_group.spawn(_player_presence, player)
 
 
-async def _start_game(randezvous, player, is_first_game):
+async def _start_game(randezvous, player):
     opponent = randezvous.get_opponent(player)
-    if is_first_game:
-        # players will play against each other for the first time
-        await player.enqueue_message(f"You will play with %s.\n" % (opponent.name))
-        await opponent.enqueue_message(f"You will play with %s.\n" % (player.name))
-        await randezvous.game_queue.put(_START_GAME)
-        async with randezvous.task_group:
-            await _start_player_io(randezvous, player)
-    else:
-        # players will play another game togerher
-        await player.enqueue_message(f"Starting a new game with %s.\n" % (opponent.name))
-        async with randezvous.task_group:
-            await _start_player_io(randezvous, player)
-            if player == randezvous.player2:
-                # make sure only one player starts the game loop
-                await randezvous.game_queue.put(_START_GAME)
-                await randezvous.task_group.spawn(_play_game, randezvous)
+    await player.enqueue_notice(f"You will play with %s.\n" % (opponent.name))
+    await opponent.enqueue_notice(f"You will play with %s.\n" % (player.name))
+    await randezvous.game_queue.put(_START_GAME)
+    async with randezvous.task_group:
+        await _start_player_io(randezvous, player)
 
 
-async def _join_lobby(player, client_stream):
+async def _join_lobby(player):
     logger = logging.getLogger("lobby")
 
-    join = True
     while True:
-        if join:
-            # I might be adding myself into my previous randevous or a totally new one
-            my_randezvous = _lobby.randezvous
-            my_randezvous.add_player(player)
+        # I might be adding myself into my previous randevous or a totally new one
+        my_randezvous = _lobby.waiting_randezvous(player.room)
+        my_randezvous.add_player(player)
+        player.randezvous = my_randezvous
 
         if my_randezvous.is_full():
-            if _lobby.randezvous == my_randezvous:
-                # this randezvous is done. create a new one for newcomers
-                _lobby.randezvous = _Randezvous()
+            # this randezvous is done. create a new one for newcomers
+            _lobby.close_randezvous(player.room, my_randezvous)
 
-            await _start_game(my_randezvous, player, join)
+            await _start_game(my_randezvous, player)
         else:
-            await player.enqueue_message("Waiting for the second player...\n")
+            await player.enqueue_notice("Waiting for the second player...\n")
             async with my_randezvous.task_group:
                 await _start_player_io(my_randezvous, player)
                 await my_randezvous.task_group.spawn(_play_game, my_randezvous)
 
-        # either the game is normally completed or at least one player has left...
+        # rematches are played within the game loop. so we get here only
+        # when at least one player has left...
+        if player.is_active() and player.disconnected:
+            # the player is only kept for its game. it is not paired with
+            # new players over a lost stream, so it leaves as well.
+            logger.info("%s is disconnected and its game is over.", player.name)
+            player.set_inactive()
+            await player.gone.set()
         if player.is_active():
             # there are definitely two players in the randezvous
             opponent = my_randezvous.get_opponent(player)
-            if opponent.is_active():
-                # game over. continue with the same randevous since both players are here
-                logger.info(f"%s and %s are starting a new game..." %
-                            (player.name, opponent.name))
-                join = False
-            else:
-                logger.warning(f"%s has left. %s will wait for a new opponent..." % (
-                    opponent.name, player.name))
-                await player.enqueue_message(f"\n%s has left.\n" % (opponent.name))
-                join = True
-                # I might add myself into the same randevous so resetting it
-                my_randezvous.reset()
+            logger.warning(f"%s has left. %s will wait for a new opponent..." % (
+                opponent.name, player.name))
+            await player.enqueue_notice(f"\n%s has left.\n" % (opponent.name))
+            # I might add myself into the same randevous so resetting it
+            my_randezvous.reset()
         else:
             if not my_randezvous.is_full():
                 # if I am the only player in the current randezvous, reset it
-                # so that new players can use it.
+                # so that new players can use it. rooms are not kept empty.
                 my_randezvous.reset()
+                if player.room:
+                    _lobby.close_randezvous(player.room, my_randezvous)
             break
 
+    player.randezvous = None
+    del _lobby.sessions[player.token]
     logger.info("%s has left...", player.name)
 
 
-async def _client_handler(client, addr):
+async def _spectator_outbound(broadcast, client_stream):
+    version = -1
+    written = None
+    while True:
+        version, frame = await broadcast.next_frame(version)
+        if frame and frame is not written:
+            # the last frame may be published right before the broadcast
+            # is closed, so it is written before the closing message
+            await client_stream.write(frame)
+            written = frame
+        if broadcast.closed:
+            await _do_write_message(client_stream, "\nA player has left. The game is over.\n")
+            return
+
+
+async def _spectator_inbound(client_stream):
+    # spectators cannot play. just wait until they leave...
+    try:
+        async for message in client_stream:
+            pass
+    except ConnectionError:
+        pass
+
+
+async def _show_leaderboard(client_stream):
+    leaderboard = _results.leaderboard(_LEADERBOARD_SIZE)
+    if not leaderboard:
+        await _do_write_message(client_stream, "\nNo games are played yet.\n")
+        return
+    lines = ["\nTop players:\n"]
+    for (rank, (player_name, standing)) in enumerate(leaderboard, 1):
+        lines.append(f"%d. %s: %d wins, %d ties, %d games\n" % (
+            rank, player_name, standing[game_results.WINS], standing[game_results.TIES],
+            standing[game_results.GAMES]))
+    await _do_write_message(client_stream, "".join(lines))
+
+
+async def _watch_game(player_name, client_stream):
+    logger = logging.getLogger("spectator")
+    randezvous = _lobby.find_game(player_name)
+    if not randezvous:
+        await _do_write_message(client_stream, "\nThere is no game to watch.\n")
+        return
+
+    broadcast = randezvous.broadcast
+    if not broadcast.frame and not broadcast.closed:
+        # no one has watched this game lately, so there is no fresh frame yet
+        await broadcast.publish(await randezvous.game.spectator_frame())
+    broadcast.num_spectators += 1
+    logger.info("watching %s vs %s, spectators: %d", randezvous.player1.name,
+                randezvous.player2.name, broadcast.num_spectators)
+    try:
+        async with _backend.TaskGroup() as g:
+            await g.spawn(_spectator_outbound, broadcast, client_stream)
+            await g.spawn(_spectator_inbound, client_stream)
+    finally:
+        broadcast.num_spectators -= 1
+
+
+async def _join_server(player_name, protocol, client_stream, room=None):
+    player = _Player(player_name, client_stream, protocol, room)
+    _lobby.sessions[player.token] = player
+    if protocol == game_controller.JSON_PROTOCOL:
+        # the prompt is not terminated by a new line, so JSON
+        # clients skip the first line they receive.
+        await _do_write_message(client_stream, "\n" + game_controller.format_notice(
+            protocol, f"Welcome %s!" % (player_name)))
+    else:
+        await _do_write_message(client_stream, f"Welcome %s!\n" % (player_name))
+    await _do_write_message(client_stream, game_controller.format_session(protocol, player.token))
+
+    async with _backend.TaskGroup() as g:
+        await g.spawn(_player_inbound, player, client_stream)
+        await _join_lobby(player)
+        await g.cancel_remaining()
+
+
+async def _resume_session(token, client_stream):
+    logger = logging.getLogger("lobby")
+    player = _lobby.sessions.get(token)
+    if not player or not player.is_active():
+        await _do_write_message(client_stream, "\nYour session is not found.\n")
+        return
+
+    logger.info("%s has reconnected.", player.name)
+    if player.protocol == game_controller.JSON_PROTOCOL:
+        await _do_write_message(client_stream, "\n" + game_controller.format_notice(
+            player.protocol, f"Welcome back %s!" % (player.name)))
+    else:
+        await _do_write_message(client_stream, f"Welcome back %s!\n" % (player.name))
+
+    # the messages queued for the lost stream are replaced with the full view
+    prev_stream = player.stream
+    player.stream = client_stream
+    await player.clear_messages()
+    player.disconnected = False
+    # the previous stream may still be open. its moves are not played anymore.
+    await prev_stream.close()
+    randezvous = player.randezvous
+    if randezvous:
+        await randezvous.game_queue.put((player, _RESYNC, None))
+        if randezvous.is_full():
+            await _notify_opponent(randezvous, player, f"\n%s is back.\n" % (player.name))
+    await player.reconnected.set()
+
+    await _player_inbound(player, client_stream)
+
+
+async def _client_handler(client_stream, addr):
     logger = logging.getLogger("client_handler")
     logger.info("%s connected.", addr)
 
     try:
-        async with client:
-            client_stream = client.as_stream()
-            player_name = await _get_player_name(client_stream)
-            logger.info("%s's name is %s", addr, player_name)
-            await _do_write_message(client_stream, f"Welcome %s!\n" % (player_name))
-            await _join_lobby(_Player(player_name, client, client_stream), client_stream)
+        player_name, protocol, room = await _get_player_name(client_stream)
+        if protocol == _WATCH_MODE:
+            logger.info("%s is a spectator", addr)
+            await _watch_game(player_name, client_stream)
+        elif protocol == _RESUME_MODE:
+            await _resume_session(player_name, client_stream)
+        elif protocol == _TOP_MODE:
+            await _show_leaderboard(client_stream)
+        else:
+            logger.info("%s's name is %s (%s)", addr, player_name, protocol)
+            await _join_server(player_name, protocol, client_stream, room)
 
         logger.info("%s closed.", addr)
     except Exception as e:
         logger.error("%s failed with: %s.", addr, e)
 
 
-async def start_game_server(host, port):
-    """Starts the match symbols game TCP server on the given host:port"""
-    async with curio.TaskGroup() as g:
-        await g.spawn(curio.tcp_server, host, port, _client_handler)
+async def start_game_server(host, port, backend=None):
+    """Starts the match symbols game TCP server on the given host:port.
+
+    backend is one of the server_backend backends and must be the one that
+    runs this coroutine. The curio backend is used by default.
+    """
+    backend = backend if backend else server_backend.CurioBackend()
+    await _run_server(backend, backend.tcp_server, host, port, _client_handler)
+
+
+async def run_in_process(main, backend=None, num_rows=None, num_cols=None, reconnect_grace=None, workers=None):
+    """Runs the game server without listening on TCP until main() returns.
+
+    main is a coroutine function, which connects clients to the server with
+    connect_in_process(). backend is same as in start_game_server().
+    num_rows, num_cols, reconnect_grace and workers override the settings of
+    the command line for this run only.
+    """
+    global _NUM_ROWS, _NUM_COLS, _RECONNECT_GRACE, _WORKERS
+    settings = (_NUM_ROWS, _NUM_COLS, _RECONNECT_GRACE, _WORKERS)
+    _NUM_ROWS = num_rows if num_rows is not None else _NUM_ROWS
+    _NUM_COLS = num_cols if num_cols is not None else _NUM_COLS
+    _RECONNECT_GRACE = reconnect_grace if reconnect_grace is not None else _RECONNECT_GRACE
+    _WORKERS = workers if workers is not None else _WORKERS
+    try:
+        await _run_server(backend if backend else server_backend.CurioBackend(), main)
+    finally:
+        (_NUM_ROWS, _NUM_COLS, _RECONNECT_GRACE, _WORKERS) = settings
+
+
+async def connect_in_process(client, addr="memory"):
+    """Connects the given client to the server run by run_in_process().
+
+    client is a coroutine function which is called with an in-memory stream
+    and talks to the server over it, same as a TCP client. The stream is
+    closed once the client returns. Returns once the server is done with the
+    client as well.
+    """
+    (server_stream, client_stream) = _backend.memory_streams()
+
+    async def serve():
+        try:
+            await _client_handler(server_stream, addr)
+        finally:
+            await server_stream.close()
+
+    async with _backend.TaskGroup(wait_all=True) as g:
+        await g.spawn(serve)
+        try:
+            await client(client_stream)
+        finally:
+            await client_stream.close()
+
+
+async def _run_server(backend, main, *args):
+    global _backend, _lobby, _results, _results_ready, _tracer, _game_pool
+    _backend = backend
+    _lobby = _Lobby()
+    _results = game_results.ResultsStore(_RESULTS_DB)
+    _results_ready = _backend.Event()
+    _game_pool = game_workers.GamePool(_backend, _WORKERS)
+    if _TRACE or _TRACE_SLOW_MS:
+        _tracer = game_tracing.MoveTracer(_TRACE_SLOW_MS)
+    try:
+        async with _backend.TaskGroup() as g:
+            await g.spawn(main, *args)
+            await g.spawn(_flush_results)
+            if _tracer:
+                await g.spawn(_report_traces)
+    finally:
+        _game_pool.close()
+        _results.close()
 
 
 if __name__ == "__main__":
@@ -305,16 +856,41 @@ if __name__ == "__main__":
                         help='number of rows in the game deck')
     parser.add_argument('--cols', dest="cols", type=int, nargs='?', default=_DEFAULT_NUM_COLS,
                         help='number of cols in the game deck')
+    parser.add_argument('--backend', dest="backend", choices=server_backend.BACKENDS,
+                        default=server_backend.CURIO_BACKEND, help='event loop backend of the server')
+    parser.add_argument('--loop', dest="loop", choices=server_backend.LOOPS,
+                        default=server_backend.ASYNCIO_LOOP,
+                        help='event loop implementation of the asyncio backend')
+    parser.add_argument('--log-level', dest="log_level", nargs='?', default="INFO",
+                        help='logging level, such as INFO or WARNING')
+    parser.add_argument('--reconnect-grace', dest="reconnect_grace", type=float, nargs='?',
+                        default=_DEFAULT_RECONNECT_GRACE,
+                        help='seconds to keep the game of a disconnected player')
+    parser.add_argument('--results-db', dest="results_db", nargs='?', default=None,
+                        help='SQLite database to store the game results in')
+    parser.add_argument('--trace', dest="trace", action='store_true',
+                        help='trace the latency of moves and log it periodically')
+    parser.add_argument('--trace-slow-ms', dest="trace_slow_ms", type=float, nargs='?', default=None,
+                        help='log the moves slower than the given milliseconds, implies --trace')
+    parser.add_argument('--workers', dest="workers", type=int, nargs='?', default=0,
+                        help='number of workers to run the games on, 0 to run them on the event loop')
 
     args = parser.parse_args()
     if args.rows:
         _NUM_ROWS = args.rows
     if args.cols:
         _NUM_COLS = args.cols
+    if args.reconnect_grace is not None:
+        _RECONNECT_GRACE = args.reconnect_grace
+    _RESULTS_DB = args.results_db
+    _TRACE = args.trace
+    _TRACE_SLOW_MS = args.trace_slow_ms
+    _WORKERS = args.workers
 
-    print(f"Starting the TCP server on %s:%d for the game deck of %dx%d." %
-          (args.host, args.port, args.rows, args.cols))
+    print(f"Starting the TCP server on %s:%d for the game deck of %dx%d with %s." %
+          (args.host, args.port, args.rows, args.cols, args.backend))
 
     logging.basicConfig(
-        format='%(asctime)s [%(levelname)s] %(name)s : %(message)s', level=logging.INFO)
-    curio.run(start_game_server(args.host, args.port))
+        format='%(asctime)s [%(levelname)s] %(name)s : %(message)s', level=args.log_level.upper())
+    backend = server_backend.create_backend(args.backend, args.loop)
+    backend.run(start_game_server(args.host, args.port, backend))
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import pytest
+import game_controller
+import game_server
+import server_backend
+from server_backend import AsyncioBackend
+
+
+class _Stream:
+    def __init__(self):
+        self.data = b""
+
+    async def write(self, data):
+        self.data += data
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = AsyncioBackend()
+    monkeypatch.setattr(game_server, "_backend", backend)
+    return backend
+
+
+def test_spectator_gets_last_frame_before_close(backend):
+    stream = _Stream()
+
+    async def main():
+        broadcast = game_server._Broadcast()
+        await broadcast.publish(b"first\n")
+        await broadcast.publish(b"last\n")
+        await broadcast.close()
+        await game_server._spectator_outbound(broadcast, stream)
+
+    asyncio.run(main())
+
+    assert stream.data == b"last\n\nA player has left. The game is over.\n"
+
+
+def test_spectator_frames_are_written_once(backend):
+    stream = _Stream()
+
+    async def main():
+        broadcast = game_server._Broadcast()
+        await broadcast.publish(b"frame\n")
+        task = asyncio.get_running_loop().create_task(game_server._spectator_outbound(broadcast, stream))
+        await asyncio.sleep(0)
+        await broadcast.close()
+        await task
+
+    asyncio.run(main())
+
+    assert stream.data == b"frame\n\nA player has left. The game is over.\n"
+
+
+def _is_curio():
+    return game_server._backend.name == server_backend.CURIO_BACKEND
+
+
+async def _connect(hello):
+    (server_stream, client_stream) = game_server._backend.memory_streams()
+
+    async def serve():
+        try:
+            await game_server._client_handler(server_stream, hello)
+        finally:
+            await server_stream.close()
+
+    # the clients are served in the background until the server is done
+    if _is_curio():
+        import curio
+        await curio.spawn(serve, daemon=True)
+    else:
+        asyncio.get_running_loop().create_task(serve())
+    await client_stream.write(hello.encode("UTF-8") + b"\n")
+    return client_stream
+
+
+async def _read_until(stream, text):
+    """Returns the data read from the stream until the given text"""
+    data = b""
+    while text.encode("UTF-8") not in data:
+        if _is_curio():
+            import curio
+            line = await curio.timeout_after(5, stream.readline)
+        else:
+            line = await asyncio.wait_for(stream.readline(), 5)
+        if not line:
+            raise EOFError(data)
+        data += line
+    return data.decode("UTF-8")
+
+
+async def _start_game(opponent_hello="@json bob"):
+    alice = await _connect("@json alice")
+    session = await _read_until(alice, '"t":"session"')
+    token = json.loads(session.splitlines()[-1])["token"]
+    bob = await _connect(opponent_hello)
+    await _read_until(alice, '"t":"start"')
+    return alice, bob, token
+
+
+@pytest.fixture(params=server_backend.BACKENDS)
+def run_server(request):
+    """Returns a function which runs main() on an in-process server of each
+    backend with the given reconnect grace"""
+    def run(main, grace):
+        backend = server_backend.create_backend(request.param)
+        finished = []
+
+        async def run_main():
+            # failures of main() are only logged by the server's task group
+            await main()
+            finished.append(True)
+
+        backend.run(game_server.run_in_process(run_main, backend, reconnect_grace=grace))
+        assert finished
+
+    return run
+
+
+def test_resume_after_disconnect(run_server):
+    async def main():
+        (alice, bob, token) = await _start_game()
+        await alice.close()
+        await _read_until(bob, "alice is disconnected")
+
+        alice = await _connect("@resume " + token)
+
+        assert '"t":"sync"' in await _read_until(alice, '"t":"sync"')
+        await _read_until(bob, "alice is back")
+
+    run_server(main, 5)
+
+
+def test_opponent_leaves_after_grace(run_server):
+    async def main():
+        (alice, bob, token) = await _start_game()
+        await alice.close()
+
+        await _read_until(bob, "alice has left")
+        alice = await _connect("@resume " + token)
+        assert "Your session is not found" in await _read_until(alice, "not found")
+
+    run_server(main, 0.05)
+
+
+def test_disconnected_player_is_not_paired_again(run_server):
+    async def main():
+        (alice, bob, token) = await _start_game()
+        await alice.close()
+        await _read_until(bob, "alice is disconnected")
+        await game_server._backend.sleep(0.5)
+        await bob.close()
+        # the grace of alice is over, but bob's is not
+        await game_server._backend.sleep(0.7)
+
+        carol = await _connect("@json carol")
+        await _read_until(carol, '"t":"session"')
+        await _connect("@json dave")
+
+        assert "You will play with dave" in await _read_until(carol, "You will play with")
+
+    run_server(main, 1)
+
+
+def test_resume_takes_over_open_session(run_server):
+    async def main():
+        (alice, bob, token) = await _start_game()
+
+        new_alice = await _connect("@resume " + token)
+        await _read_until(new_alice, '"t":"sync"')
+
+        with pytest.raises(EOFError):
+            await _read_until(alice, "never")
+        with pytest.raises(ConnectionResetError):
+            await alice.write(b"1A\n")
+        await _read_until(bob, "alice is back")
+
+    run_server(main, 5)
+
+
+def test_text_opponent_gets_full_view_after_notice(run_server):
+    async def main():
+        (alice, bob, token) = await _start_game("bob")
+        await alice.close()
+
+        view = await _read_until(bob, "alice is disconnected")
+        view = view[view.index("alice is disconnected"):] + await _read_until(bob, "alice: 0, bob: 0")
+
+        assert "  A B C D E F \n1 . . " in view
+
+    run_server(main, 5)
+
+
+def test_spectator_frame_is_rendered_once_per_move(run_server, monkeypatch):
+    num_views = []
+    spectator_view = game_controller.GameController.spectator_view
+
+    def count_spectator_view(self):
+        num_views.append(True)
+        return spectator_view(self)
+
+    monkeypatch.setattr(game_controller.GameController, "spectator_view", count_spectator_view)
+
+    async def main():
+        (alice, bob, token) = await _start_game()
+        start = json.loads((await _read_until(bob, '"t":"start"')).splitlines()[-1])
+        watchers = [await _connect("@watch alice") for _ in range(0, 3)]
+        for watcher in watchers:
+            await _read_until(watcher, game_controller._CLEAR_SCREEN_CODE)
+        del num_views[:]
+
+        await (alice if start["turn"] == "alice" else bob).write(b"1A\n")
+
+        # each spectator reads the frame of the move
+        for watcher in watchers:
+            await _read_until(watcher, game_controller._CLEAR_SCREEN_CODE)
+        assert len(num_views) == 1
+
+    run_server(main, 5)
+
+
+def test_leaderboard(run_server):
+    async def main():
+        top = await _connect("@top")
+        assert "No games are played yet" in await _read_until(top, "No games")
+
+        game_server._results.record("alice", "bob", "alice", 3, 1)
+        top = await _connect("@top")
+
+        assert "1. alice: 1 wins, 0 ties, 1 games\n2. bob: 0 wins" in await _read_until(top, "2. bob")
+
+    run_server(main, 5)
@@ -171,3 +171,29 @@ def test_missing_second_player():
 def test_duplicate_players():
     with pytest.raises(ValueError):
         game = Game("abcd", _player1, _player1)
+
+
+def test_reset(game):
+    player = game.whose_turn()
+    all_letters = game.peek()
+    game.play(player, all_letters[0][0])
+    game.play(player, all_letters[0][1])
+
+    game.reset()
+
+    assert len(game.peek()) == len(_symbols)
+    assert game.whose_turn() == _player1 or game.whose_turn() == _player2
+    result = game.play(game.whose_turn(), all_letters[0][0])
+    assert result[_player1] == 0
+    assert result[_player2] == 0
+
+
+def test_reset_with_new_symbols(game):
+    game.reset("vwxyz")
+
+    assert sorted(game._deck[i].symbol() for (i, j) in game.peek()) == list("vwxyz")
+
+
+def test_reset_with_different_number_of_symbols(game):
+    with pytest.raises(ValueError):
+        game.reset("abc")
@@ -0,0 +1,149 @@
+import logging
+import time
+
+
+DECODE_STAGE = "decode"
+GAME_QUEUE_STAGE = "game_queue"
+PLAY_STAGE = "play"
+PLAYER_QUEUE_STAGE = "player_queue"
+WRITE_STAGE = "write"
+TOTAL = "total"
+STAGES = (DECODE_STAGE, GAME_QUEUE_STAGE, PLAY_STAGE, PLAYER_QUEUE_STAGE, WRITE_STAGE)
+
+_NUM_BUCKETS = 40
+
+
+def _now():
+    return time.perf_counter_ns()
+
+
+class Histogram:
+    """Counts durations in buckets of powers of 2 microseconds.
+
+    The bucket i counts the durations in [2^(i-1), 2^i) microseconds, and the
+    bucket 0 counts the durations shorter than a microsecond. Percentiles are
+    approximated with the upper bounds of the buckets.
+    """
+
+    def __init__(self):
+        self._buckets = [0] * _NUM_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, duration_ns):
+        bucket = min(max(duration_ns, 0) // 1000, 1 << (_NUM_BUCKETS - 1)).bit_length()
+        self._buckets[min(bucket, _NUM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, p):
+        """Returns the approximate p-th percentile in nanoseconds, 0 <= p <= 1"""
+        if not self.count:
+            return 0
+        rank = p * self.count
+        seen = 0
+        for i in range(0, _NUM_BUCKETS):
+            seen += self._buckets[i]
+            if seen >= rank and self._buckets[i]:
+                return min((1 << i) * 1000, self.max_ns)
+        return self.max_ns
+
+    def mean(self):
+        return self.total_ns // self.count if self.count else 0
+
+
+class MoveTrace:
+    """Timestamps of a move from the socket read to the game's response.
+
+    The game's response is delivered to both players, so the timestamps of
+    the player queues and the socket writes are kept by the MoveTracer.
+    """
+
+    __slots__ = ("player", "read", "decoded", "dequeued", "played")
+
+    def __init__(self, player):
+        self.player = player
+        self.read = _now()
+        self.decoded = 0
+        self.dequeued = 0
+        self.played = 0
+
+    def mark_decoded(self):
+        self.decoded = _now()
+
+    def mark_dequeued(self):
+        self.dequeued = _now()
+
+    def mark_played(self):
+        self.played = _now()
+
+
+class MoveTracer:
+    """Aggregates the timings of moves into a histogram per stage.
+
+    The stages of a move are decoding the move, waiting in the game queue,
+    playing the move on the game, waiting in the player queue and writing the
+    response to the socket. Each response delivered to a player is counted
+    in the player queue, write and total histograms. reset() starts new
+    histograms, so that each report shows only the recent moves.
+    """
+
+    def __init__(self, slow_threshold_ms=None):
+        """Initializes the tracer.
+
+        If slow_threshold_ms is given, moves whose responses take longer than
+        the threshold from the socket read to the socket write are logged.
+        """
+        self._slow_threshold_ns = int(slow_threshold_ms * 1000000) if slow_threshold_ms else None
+        self._logger = logging.getLogger("trace")
+        self.reset()
+
+    def reset(self):
+        """Drops the timings recorded so far"""
+        self.histograms = {stage: Histogram() for stage in STAGES + (TOTAL,)}
+
+    def is_empty(self):
+        """Returns True if nothing is recorded since the last reset"""
+        return not any(histogram.count for histogram in self.histograms.values())
+
+    def start(self, player):
+        """Returns a new trace of a move of the given player, just read"""
+        return MoveTrace(player)
+
+    def record_play(self, trace):
+        """Records the stages until the move is played on the game"""
+        trace.mark_played()
+        self.histograms[DECODE_STAGE].add(trace.decoded - trace.read)
+        self.histograms[GAME_QUEUE_STAGE].add(trace.dequeued - trace.decoded)
+        self.histograms[PLAY_STAGE].add(trace.played - trace.dequeued)
+
+    def record_delivery(self, trace, dequeued, recipient):
+        """Records the delivery of the response of a move to a player.
+
+        dequeued is the time when the response is taken from the player queue.
+        """
+        written = _now()
+        self.histograms[PLAYER_QUEUE_STAGE].add(dequeued - trace.played)
+        self.histograms[WRITE_STAGE].add(written - dequeued)
+        total = written - trace.read
+        self.histograms[TOTAL].add(total)
+        if self._slow_threshold_ns and total > self._slow_threshold_ns:
+            self._logger.warning(
+                "slow move of %s delivered to %s in %.3f ms: decode: %.3f, game_queue: %.3f, "
+                "play: %.3f, player_queue: %.3f, write: %.3f", trace.player, recipient,
+                total / 1e6, (trace.decoded - trace.read) / 1e6, (trace.dequeued - trace.decoded) / 1e6,
+                (trace.played - trace.dequeued) / 1e6, (dequeued - trace.played) / 1e6,
+                (written - dequeued) / 1e6)
+
+    def summary(self):
+        """Returns the lines of a table of the stage histograms in milliseconds"""
+        lines = ["%-12s %10s %10s %10s %10s %10s" % ("stage", "count", "mean", "p50", "p99", "max")]
+        for stage in STAGES + (TOTAL,):
+            histogram = self.histograms[stage]
+            lines.append("%-12s %10d %10.3f %10.3f %10.3f %10.3f" % (
+                stage, histogram.count, histogram.mean() / 1e6, histogram.percentile(0.5) / 1e6,
+                histogram.percentile(0.99) / 1e6, histogram.max_ns / 1e6))
+        return lines
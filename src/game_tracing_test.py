@@ -0,0 +1,64 @@
+import logging
+from game_tracing import Histogram, MoveTracer, STAGES, TOTAL, PLAY_STAGE
+
+
+def test_histogram():
+    histogram = Histogram()
+    for duration_us in (1, 3, 3, 100, 5000):
+        histogram.add(duration_us * 1000)
+
+    assert histogram.count == 5
+    assert histogram.max_ns == 5000000
+    assert histogram.mean() == (1 + 3 + 3 + 100 + 5000) * 1000 // 5
+    assert histogram.percentile(0.5) == 4000
+    assert histogram.percentile(1) == 5000000
+
+
+def test_empty_histogram():
+    histogram = Histogram()
+
+    assert histogram.percentile(0.99) == 0
+    assert histogram.mean() == 0
+
+
+def test_tracer_records_stages():
+    tracer = MoveTracer()
+    trace = tracer.start("p1")
+    trace.mark_decoded()
+    trace.mark_dequeued()
+    tracer.record_play(trace)
+
+    tracer.record_delivery(trace, trace.played, "p1")
+    tracer.record_delivery(trace, trace.played, "p2")
+
+    assert tracer.histograms[PLAY_STAGE].count == 1
+    assert tracer.histograms[TOTAL].count == 2
+    assert len(tracer.summary()) == len(STAGES) + 2
+
+
+def test_tracer_logs_slow_moves(caplog):
+    tracer = MoveTracer(slow_threshold_ms=0.000001)
+    trace = tracer.start("p1")
+    trace.mark_decoded()
+    trace.mark_dequeued()
+    tracer.record_play(trace)
+
+    with caplog.at_level(logging.WARNING, logger="trace"):
+        tracer.record_delivery(trace, trace.played, "p2")
+
+    assert "slow move of p1 delivered to p2" in caplog.text
+
+
+def test_tracer_reset():
+    tracer = MoveTracer()
+    assert tracer.is_empty()
+    trace = tracer.start("p1")
+    trace.mark_decoded()
+    trace.mark_dequeued()
+    tracer.record_play(trace)
+    assert not tracer.is_empty()
+
+    tracer.reset()
+
+    assert tracer.is_empty()
+    assert tracer.histograms[PLAY_STAGE].count == 0
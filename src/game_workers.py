@@ -0,0 +1,200 @@
+import concurrent.futures
+import itertools
+import multiprocessing
+import signal
+import sys
+import game_controller
+
+
+# games of this process, by game id. when games run on worker processes,
+# each worker process has its own games here.
+_games = {}
+_game_ids = itertools.count(1)
+
+
+def is_free_threaded():
+    """Returns whether this Python build runs without the GIL"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _ignore_interrupts():
+    # CTRL+C interrupts the whole process group, but worker processes are
+    # shut down by the server
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _create_game(game_id, num_rows, num_cols, player1, player2, protocols):
+    game = game_controller.GameController(num_rows, num_cols, player1, player2, protocols)
+    _games[game_id] = (game, (player1, player2))
+    return game.initial_views()
+
+
+def _play_move(game_id, player, move, render_frame):
+    (game, players) = _games[game_id]
+    views = game.play(player, move)
+    frame = None
+    if render_frame and views.get(players[0]) and views.get(players[1]):
+        # both players see the move, so it is not an invalid input
+        frame = game.spectator_view().encode("UTF-8")
+    return views, frame
+
+
+def _reset_game(game_id, render_frame):
+    (game, _) = _games[game_id]
+    game.reset()
+    return game.initial_views(), game.spectator_view().encode("UTF-8") if render_frame else None
+
+
+def _resync_view(game_id, player):
+    return _games[game_id][0].resync_view(player)
+
+
+def _spectator_frame(game_id):
+    return _games[game_id][0].spectator_view().encode("UTF-8")
+
+
+def _drop_game(game_id):
+    _games.pop(game_id, None)
+
+
+class PooledGame:
+    """A game controller which lives either on the event loop thread or on a
+    worker of a GamePool.
+
+    Methods have the same meaning as the GameController methods, but they are
+    coroutines. Spectator views are returned as encoded frames, and play()
+    and reset() render the frame in the same call if render_frame is given,
+    so that moves and frames cross to the worker and back only once.
+    """
+
+    def __init__(self, pool, worker, game_id):
+        self._pool = pool
+        self._worker = worker
+        self._game_id = game_id
+
+    async def start(self, num_rows, num_cols, player1, player2, protocols=None):
+        """Creates the game controller and returns the initial views"""
+        return await self._pool._call(self._worker, _create_game, self._game_id,
+                                      num_rows, num_cols, player1, player2, protocols)
+
+    async def play(self, player, move, render_frame=False):
+        """Returns the views of the move and the spectator frame, or None if
+        the frame is not rendered or the move is not seen by both players."""
+        return await self._pool._call(self._worker, _play_move, self._game_id, player, move, render_frame)
+
+    async def reset(self, render_frame=False):
+        """Starts a rematch and returns the initial views and the spectator frame"""
+        return await self._pool._call(self._worker, _reset_game, self._game_id, render_frame)
+
+    async def resync_view(self, player):
+        return await self._pool._call(self._worker, _resync_view, self._game_id, player)
+
+    async def spectator_frame(self):
+        return await self._pool._call(self._worker, _spectator_frame, self._game_id)
+
+    def close(self):
+        """Drops the game. It does not block, so it can be called while the
+        task of the game is cancelled."""
+        self._pool._release(self._worker, self._game_id)
+
+
+class GamePool:
+    """Runs games on a pool of workers, so that the event loop only does I/O.
+
+    Each worker is an executor with a single thread or process, and each game
+    is pinned to the least loaded worker when it is created. Hence, calls on a
+    game are run one at a time and in order, and the game controller lives on
+    its worker until the game is closed. Workers are threads on free-threaded
+    Python builds, where rendering on threads runs in parallel, and processes
+    otherwise.
+
+    With no workers, games run inline on the event loop thread.
+
+    A worker whose process dies is replaced with a new one. The games pinned
+    to it are lost and their calls fail, but the new games run as usual.
+    """
+
+    def __init__(self, backend, num_workers=0, threads=None):
+        """Initializes the pool with the given number of workers.
+
+        backend is the server_backend backend of the event loop. threads
+        selects thread or process workers, and is detected from the Python
+        build by default.
+        """
+        if num_workers < 0:
+            raise ValueError
+        self._backend = backend
+        self.threads = is_free_threaded() if threads is None else threads
+        self._executors = []
+        # number of games pinned to each worker
+        self._loads = [0] * num_workers
+        self._closed = False
+        for _ in range(num_workers):
+            self._executors.append(self._new_executor())
+
+    @property
+    def num_workers(self):
+        return len(self._executors)
+
+    def loads(self):
+        """Returns the number of games pinned to each worker"""
+        return list(self._loads)
+
+    def new_game(self):
+        """Returns a new game pinned to the least loaded worker.
+
+        The game must be started with PooledGame.start() and closed with
+        PooledGame.close().
+        """
+        worker = None
+        if self._executors:
+            worker = min(range(0, len(self._loads)), key=self._loads.__getitem__)
+            self._loads[worker] += 1
+        return PooledGame(self, worker, next(_game_ids))
+
+    def close(self):
+        self._closed = True
+        for executor in self._executors:
+            executor.shutdown(wait=False)
+
+    async def _call(self, worker, func, *args):
+        if worker is None:
+            return func(*args)
+        executor = self._executors[worker]
+        try:
+            return await self._backend.run_in_executor(executor, func, *args)
+        except concurrent.futures.BrokenExecutor:
+            self._replace_executor(worker, executor)
+            raise
+
+    def _release(self, worker, game_id):
+        if worker is None:
+            _drop_game(game_id)
+            return
+        self._loads[worker] -= 1
+        if self._closed:
+            return
+        try:
+            # queued after the pending calls of the game on its worker
+            self._executors[worker].submit(_drop_game, game_id)
+        except concurrent.futures.BrokenExecutor:
+            # the game is gone along with the worker
+            self._replace_executor(worker, self._executors[worker])
+
+    def _new_executor(self):
+        if self.threads:
+            return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # the event loop may already run threads, which do not mix well
+        # with fork()
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_ignore_interrupts)
+
+    def _replace_executor(self, worker, executor):
+        # other calls of the games on the broken worker may fail as well, and
+        # it is replaced only once
+        if self._closed or self._executors[worker] is not executor:
+            return
+        executor.shutdown(wait=False)
+        self._executors[worker] = self._new_executor()
@@ -0,0 +1,109 @@
+import concurrent.futures
+import os
+import pytest
+import game_controller
+import game_workers
+import server_backend
+from game_workers import GamePool
+from server_backend import AsyncioBackend
+
+
+_player1 = "p1"
+_player2 = "p2"
+
+
+async def _play_game(pool):
+    game = pool.new_game()
+    views = await game.start(2, 2, _player1, _player2, {_player2: game_controller.JSON_PROTOCOL})
+    assert views[_player1] and views[_player2]
+
+    (views, frame) = await game.play(_player1, "9Z", True)
+    assert views[_player1] and not views.get(_player2)
+    assert frame is None
+
+    # the first player is picked randomly
+    (views, frame) = await game.play(_player1, "1A", True)
+    if not views.get(_player2):
+        (views, frame) = await game.play(_player2, "1A", True)
+    assert views[_player2].startswith('{"t":"move"')
+    assert frame == (await game.spectator_frame())
+    assert await game.resync_view(_player2)
+
+    (views, frame) = await game.reset()
+    assert views[_player1] and frame is None
+    game.close()
+
+
+@pytest.mark.parametrize("backend_name", server_backend.BACKENDS)
+def test_inline_games(backend_name):
+    backend = server_backend.create_backend(backend_name)
+    pool = GamePool(backend)
+    backend.run(_play_game(pool))
+
+    assert pool.num_workers == 0
+    assert not game_workers._games
+
+
+@pytest.mark.parametrize("backend_name", server_backend.BACKENDS)
+def test_thread_workers(backend_name):
+    backend = server_backend.create_backend(backend_name)
+    pool = GamePool(backend, 2, threads=True)
+
+    played = []
+
+    async def play():
+        # failures of the tasks are only logged by the task group
+        await _play_game(pool)
+        played.append(True)
+
+    async def main():
+        async with backend.TaskGroup(wait_all=True) as g:
+            for _ in range(0, 4):
+                await g.spawn(play)
+
+    backend.run(main())
+    pool.close()
+    assert len(played) == 4
+
+
+@pytest.mark.parametrize("backend_name", server_backend.BACKENDS)
+def test_process_workers(backend_name):
+    backend = server_backend.create_backend(backend_name)
+    pool = GamePool(backend, 1, threads=False)
+    backend.run(_play_game(pool))
+    pool.close()
+
+
+def test_games_are_pinned_to_least_loaded_workers():
+    pool = GamePool(AsyncioBackend(), 2, threads=True)
+    game1 = pool.new_game()
+    game2 = pool.new_game()
+    assert pool.loads() == [1, 1]
+
+    game1.close()
+    pool.new_game()
+    assert pool.loads() == [1, 1]
+    game2.close()
+    assert pool.loads() == [1, 0]
+    pool.close()
+
+
+def test_broken_worker_is_replaced():
+    backend = AsyncioBackend()
+    pool = GamePool(backend, 1, threads=False)
+
+    async def main():
+        game = pool.new_game()
+        await game.start(2, 2, _player1, _player2)
+        # the worker process dies along with the game
+        with pytest.raises(concurrent.futures.BrokenExecutor):
+            await pool._call(0, os._exit, 1)
+        with pytest.raises(KeyError):
+            await game.resync_view(_player1)
+        game.close()
+
+        await _play_game(pool)
+
+    backend.run(main())
+    assert pool.loads() == [0]
+    pool.close()
@@ -0,0 +1,432 @@
+"""Event loop backends of the match symbols game server.
+
+The game server only uses the few primitives below, so that the same lobby
+and game logic can run on either curio or asyncio:
+
+- Queue() and Event() create a queue and an event. Queues have async put()
+  and get() methods, and events have async set() and wait() methods.
+- TaskGroup(wait_all=False) creates a task group which is done once any of
+  its tasks is done, or all of them if wait_all is given, and then cancels
+  the remaining tasks. Tasks are spawned with the async
+  spawn(coro_func, *args) method and the group is joined with "async with".
+  The async cancel_remaining() method cancels all tasks.
+- sleep(seconds) suspends the current task for the given seconds.
+- wait_event(event, timeout) waits for the event up to the given seconds
+  and returns whether the event is set.
+- run_in_thread(func, *args) runs the given blocking function in a thread
+  and returns its result.
+- run_in_executor(executor, func, *args) runs the given function on the
+  given concurrent.futures executor and returns its result.
+- tcp_server(host, port, handler) serves TCP clients. handler is called as
+  handler(stream, addr) for each client and the client is closed once the
+  handler returns. Streams have async readline() and write() methods and
+  also iterate over the received lines with "async for". Their async
+  close() method closes the connection early, even while another task
+  reads from the stream, which then sees the end of the stream.
+- memory_streams() creates two streams connected to each other in memory,
+  which behave as the TCP streams and are closed with the async close()
+  method. Writes fail with ConnectionResetError once the peer is closed.
+- run(coro) runs the given coroutine on the backend's event loop.
+"""
+
+import asyncio
+import collections
+import functools
+import logging
+import socket
+
+
+CURIO_BACKEND = "curio"
+ASYNCIO_BACKEND = "asyncio"
+BACKENDS = (CURIO_BACKEND, ASYNCIO_BACKEND)
+ASYNCIO_LOOP = "asyncio"
+UVLOOP_LOOP = "uvloop"
+LOOPS = (ASYNCIO_LOOP, UVLOOP_LOOP)
+# the asyncio streams stop reading from clients which send more than this
+# many bytes ahead of the server, same as curio's pull-based streams
+_READ_HIGH_WATER = 64 * 1024
+_READ_LOW_WATER = _READ_HIGH_WATER // 4
+
+
+def create_backend(name=CURIO_BACKEND, loop=ASYNCIO_LOOP):
+    """Creates the backend with the given name.
+
+    loop selects the event loop implementation of the asyncio backend. It is
+    either ASYNCIO_LOOP or UVLOOP_LOOP, which requires the uvloop package.
+    """
+    if name == CURIO_BACKEND:
+        return CurioBackend()
+    elif name == ASYNCIO_BACKEND:
+        return AsyncioBackend(loop)
+    raise ValueError
+
+
+class CurioBackend:
+    """Runs the game server on curio"""
+
+    name = CURIO_BACKEND
+
+    def __init__(self):
+        # curio is imported here so that it is not needed for asyncio
+        import curio
+        self._curio = curio
+
+    def Queue(self):
+        return self._curio.Queue()
+
+    def Event(self):
+        return self._curio.Event()
+
+    def TaskGroup(self, wait_all=False):
+        return self._curio.TaskGroup(wait=all if wait_all else any)
+
+    async def sleep(self, seconds):
+        await self._curio.sleep(seconds)
+
+    async def wait_event(self, event, timeout):
+        await self._curio.ignore_after(timeout, event.wait)
+        return event.is_set()
+
+    async def run_in_thread(self, func, *args):
+        return await self._curio.run_in_thread(func, *args)
+
+    async def run_in_executor(self, executor, func, *args):
+        return await self._curio.run_in_executor(executor, func, *args)
+
+    async def tcp_server(self, host, port, handler):
+        async def client_handler(client, addr):
+            async with client:
+                await handler(_CurioStream(client), addr)
+
+        await self._curio.tcp_server(host, port, client_handler)
+
+    def memory_streams(self):
+        return _memory_streams(self.Queue)
+
+    def run(self, coro):
+        return self._curio.run(coro)
+
+
+class _CurioStream:
+    """A curio socket stream which can be closed while another task reads it"""
+
+    def __init__(self, client):
+        self._client = client
+        # asyncio transports disable Nagle's algorithm by default. so do the
+        # curio sockets, otherwise small game messages wait for the acks of
+        # the previous ones and the backends cannot be compared.
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = client.as_stream()
+        self.readline = self._stream.readline
+        self.write = self._stream.write
+
+    def __aiter__(self):
+        return self._stream.__aiter__()
+
+    async def close(self):
+        # closing the socket does not wake up its readers, but shutting it
+        # down does. the socket is closed once the handler returns.
+        try:
+            await self._client.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class AsyncioBackend:
+    """Runs the game server on asyncio with protocol-based transports"""
+
+    name = ASYNCIO_BACKEND
+
+    def __init__(self, loop=ASYNCIO_LOOP):
+        if loop not in LOOPS:
+            raise ValueError
+        self._loop = loop
+
+    def Queue(self):
+        return asyncio.Queue()
+
+    def Event(self):
+        return _AsyncioEvent()
+
+    def TaskGroup(self, wait_all=False):
+        return _AsyncioTaskGroup(wait_all)
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    async def wait_event(self, event, timeout):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return event.is_set()
+
+    async def run_in_thread(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def run_in_executor(self, executor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    async def tcp_server(self, host, port, handler):
+        loop = asyncio.get_running_loop()
+        # the loop only keeps weak references to its tasks, so the handler
+        # tasks are kept here until they are done
+        tasks = set()
+
+        def handler_done(stream, task):
+            tasks.discard(task)
+            stream._protocol._transport.close()
+
+        def client_connected(stream):
+            task = loop.create_task(handler(stream, stream.peername()))
+            tasks.add(task)
+            task.add_done_callback(functools.partial(handler_done, stream))
+
+        server = await loop.create_server(
+            lambda: _StreamProtocol(client_connected), host, port)
+        async with server:
+            await server.serve_forever()
+
+    def memory_streams(self):
+        return _memory_streams(self.Queue)
+
+    def run(self, coro):
+        if self._loop == UVLOOP_LOOP:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return asyncio.run(coro)
+
+
+class _AsyncioEvent:
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def set(self):
+        self._event.set()
+
+    async def wait(self):
+        await self._event.wait()
+
+
+class _AsyncioTaskGroup:
+    """A task group which is done once any of its tasks is done.
+
+    Same as curio's TaskGroup(wait=any), it can be joined by multiple tasks.
+    All of them return once any task of the group is done. If wait_all is
+    given, the group is done once all of its tasks are done instead, same as
+    curio's TaskGroup(wait=all).
+    """
+
+    def __init__(self, wait_all=False):
+        self._tasks = set()
+        self._wait_all = wait_all
+        self._done = asyncio.Event()
+
+    async def spawn(self, coro_func, *args):
+        task = asyncio.get_running_loop().create_task(coro_func(*args))
+        task.add_done_callback(self._task_done)
+        self._tasks.add(task)
+        return task
+
+    async def cancel_remaining(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None and self._wait_all:
+                # tasks may finish before the later ones are spawned, so
+                # completion is checked when the group is joined. tasks may
+                # also be spawned while the group is joined.
+                while not all(task.done() for task in self._tasks):
+                    await asyncio.wait(self._tasks)
+            elif exc_type is None and self._tasks:
+                await self._done.wait()
+        finally:
+            await self.cancel_remaining()
+
+    def _task_done(self, task):
+        self._done.set()
+        if not task.cancelled() and task.exception():
+            logging.getLogger("asyncio").error(
+                "Task Crash: %s", task, exc_info=task.exception())
+
+
+class _StreamProtocol(asyncio.Protocol):
+    """Splits the received bytes into lines and exposes them as a stream.
+
+    Reading from the transport is paused once the received lines which are
+    not read yet exceed _READ_HIGH_WATER bytes, and resumed once they drop
+    below _READ_LOW_WATER bytes. A line longer than _READ_HIGH_WATER bytes
+    is split.
+    """
+
+    def __init__(self, client_connected):
+        self._client_connected = client_connected
+        self._transport = None
+        self._buffer = bytearray()
+        self._lines = collections.deque()
+        # bytes of the lines which are not read yet
+        self._num_buffered = 0
+        self._paused = False
+        self._eof = False
+        self._readable = None
+        self._writable = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._client_connected(_Stream(self))
+
+    def data_received(self, data):
+        self._buffer += data
+        end = self._buffer.find(b"\n")
+        while end != -1:
+            self._add_line(end + 1)
+            end = self._buffer.find(b"\n")
+        if len(self._buffer) > _READ_HIGH_WATER:
+            self._add_line(len(self._buffer))
+        if self._num_buffered > _READ_HIGH_WATER and not self._paused:
+            self._paused = True
+            self._transport.pause_reading()
+        if self._lines:
+            self._wake_reader()
+
+    def eof_received(self):
+        self._eof = True
+        self._wake_reader()
+
+    def connection_lost(self, exc):
+        self._eof = True
+        self._wake_reader()
+        self._wake_writer()
+
+    def pause_writing(self):
+        self._writable = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self):
+        self._wake_writer()
+
+    async def readline(self):
+        while not self._lines and not self._eof:
+            self._readable = asyncio.get_running_loop().create_future()
+            await self._readable
+        if self._lines:
+            line = self._lines.popleft()
+            self._num_buffered -= len(line)
+            if self._paused and self._num_buffered < _READ_LOW_WATER and not self._eof:
+                self._paused = False
+                self._transport.resume_reading()
+            return line
+        line = bytes(self._buffer)
+        self._buffer.clear()
+        return line
+
+    async def write(self, data):
+        if self._transport.is_closing():
+            raise ConnectionResetError
+        self._transport.write(data)
+        if self._writable:
+            await self._writable
+
+    def _add_line(self, length):
+        self._lines.append(bytes(self._buffer[:length]))
+        del self._buffer[:length]
+        self._num_buffered += length
+
+    def _wake_reader(self):
+        if self._readable and not self._readable.done():
+            self._readable.set_result(None)
+
+    def _wake_writer(self):
+        if self._writable and not self._writable.done():
+            self._writable.set_result(None)
+        self._writable = None
+
+
+class _Stream:
+    def __init__(self, protocol):
+        self._protocol = protocol
+
+    def peername(self):
+        return self._protocol._transport.get_extra_info("peername")
+
+    async def readline(self):
+        return await self._protocol.readline()
+
+    async def write(self, data):
+        await self._protocol.write(data)
+
+    async def close(self):
+        self._protocol._transport.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        line = await self._protocol.readline()
+        if not line:
+            raise StopAsyncIteration
+        return line
+
+
+def _memory_streams(queue_factory):
+    stream1 = _MemoryStream(queue_factory())
+    stream2 = _MemoryStream(queue_factory())
+    stream1._peer = stream2
+    stream2._peer = stream1
+    return stream1, stream2
+
+
+class _MemoryStream:
+    """One end of an in-memory connection. Writes are put into the inbox of
+    the peer as chunks of bytes, and None marks the end of the stream."""
+
+    def __init__(self, inbox):
+        self._inbox = inbox
+        self._peer = None
+        self._buffer = bytearray()
+        self._eof = False
+        self.closed = False
+
+    async def readline(self):
+        end = self._buffer.find(b"\n")
+        while end == -1 and not self._eof:
+            chunk = await self._inbox.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer += chunk
+                end = self._buffer.find(b"\n")
+        line = bytes(self._buffer[:end + 1] if end != -1 else self._buffer)
+        del self._buffer[:len(line)]
+        return line
+
+    async def write(self, data):
+        if self.closed or self._peer.closed:
+            raise ConnectionResetError
+        await self._peer._inbox.put(bytes(data))
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            await self._peer._inbox.put(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        line = await self.readline()
+        if not line:
+            raise StopAsyncIteration
+        return line
@@ -0,0 +1,157 @@
+import asyncio
+from server_backend import AsyncioBackend, _StreamProtocol
+
+
+class _Transport(asyncio.Transport):
+    def __init__(self):
+        super().__init__()
+        self.data = b""
+        self.closed = False
+        self.paused = False
+
+    def write(self, data):
+        self.data += data
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    def pause_reading(self):
+        self.paused = True
+
+    def resume_reading(self):
+        self.paused = False
+
+
+def _connect():
+    streams = []
+    protocol = _StreamProtocol(streams.append)
+    transport = _Transport()
+    protocol.connection_made(transport)
+    return protocol, transport, streams[0]
+
+
+def test_task_group_waits_any():
+    backend = AsyncioBackend()
+    cancelled = []
+
+    async def forever():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        async with backend.TaskGroup() as g:
+            await g.spawn(forever)
+            await g.spawn(asyncio.sleep, 0)
+
+    asyncio.run(main())
+
+    assert cancelled == [True]
+
+
+def test_stream_splits_lines():
+    async def main():
+        protocol, transport, stream = _connect()
+        protocol.data_received(b"1A\n1")
+        protocol.data_received(b"B\n2")
+        protocol.eof_received()
+        lines = [line async for line in stream]
+        await stream.write(b"hello")
+        return lines, transport.data
+
+    lines, data = asyncio.run(main())
+
+    assert lines == [b"1A\n", b"1B\n", b"2"]
+    assert data == b"hello"
+
+
+def test_stream_readline_waits_for_data():
+    async def main():
+        protocol, transport, stream = _connect()
+        asyncio.get_running_loop().call_soon(protocol.data_received, b"name\n")
+        return await stream.readline()
+
+    assert asyncio.run(main()) == b"name\n"
+
+
+def test_memory_streams():
+    async def main():
+        backend = AsyncioBackend()
+        (stream1, stream2) = backend.memory_streams()
+        await stream1.write(b"1A\n1")
+        await stream1.write(b"B\n")
+        await stream1.close()
+        lines = [line async for line in stream2]
+        try:
+            await stream2.write(b"hello")
+        except ConnectionResetError:
+            return lines, True
+        return lines, False
+
+    assert asyncio.run(main()) == ([b"1A\n", b"1B\n"], True)
+
+
+def test_task_group_waits_all():
+    backend = AsyncioBackend()
+    done = []
+
+    async def sleep(seconds):
+        await asyncio.sleep(seconds)
+        done.append(seconds)
+
+    async def main():
+        async with backend.TaskGroup(wait_all=True) as g:
+            await g.spawn(sleep, 0.01)
+            await g.spawn(sleep, 0)
+
+    asyncio.run(main())
+
+    assert done == [0, 0.01]
+
+
+def test_task_group_waits_all_with_task_done_before_spawn():
+    backend = AsyncioBackend()
+    done = []
+
+    async def sleep(seconds):
+        await asyncio.sleep(seconds)
+        done.append(seconds)
+
+    async def main():
+        async with backend.TaskGroup(wait_all=True) as g:
+            await g.spawn(sleep, 0)
+            # the first task is done before the second one is spawned
+            await asyncio.sleep(0.01)
+            await g.spawn(sleep, 0.01)
+
+    asyncio.run(main())
+
+    assert done == [0, 0.01]
+
+
+def test_stream_pauses_reading_when_lines_are_not_read():
+    async def main():
+        protocol, transport, stream = _connect()
+        line = b"x" * 1023 + b"\n"
+        for i in range(0, 100):
+            protocol.data_received(line)
+        assert transport.paused
+        while transport.paused:
+            assert await stream.readline() == line
+        return len(protocol._lines)
+
+    assert asyncio.run(main()) * 1024 < 64 * 1024 // 4
+
+
+def test_stream_splits_long_lines():
+    async def main():
+        protocol, transport, stream = _connect()
+        protocol.data_received(b"x" * (64 * 1024 + 1))
+        return await stream.readline()
+
+    assert len(asyncio.run(main())) == 64 * 1024 + 1
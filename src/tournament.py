@@ -0,0 +1,283 @@
+#!/usr/bin/env python3.7
+
+"""Runs tournaments of bots on an in-process game server.
+
+Bots connect to the game server over in-memory streams instead of sockets,
+but they go through the same server code as the TCP clients: the lobby, the
+game tasks and the JSON lines protocol. Each round of the tournament is a
+set of scheduled pairings, which are played at the same time. Each pairing
+is a match of a number of games in a room of its own, so that the two bots
+of a pairing meet each other. See "Rooms" in game_server.py.
+
+Tournaments are either round-robin, where each bot plays every other bot
+once, or single elimination brackets, where the better seed advances on a
+tie. Since there is no network in between, tournaments also measure how
+many games per second the server can sustain in one process.
+
+Each match has a time limit of game_timeout seconds per game. A match which
+is not over in time, for instance because its game has crashed, is cut
+short and counted with the games its bots have finished. It is not won by
+either player, but the better seed still advances in brackets.
+
+# Run:
+python3 tournament.py [-h] [--players [PLAYERS]]
+                      [--format {round-robin,bracket}] [--games [GAMES]]
+                      [--rows [ROWS]] [--cols [COLS]]
+                      [--backend {curio,asyncio}] [--loop {asyncio,uvloop}]
+                      [--workers [WORKERS]] [--game-timeout [GAME_TIMEOUT]]
+                      [--log-level [LOG_LEVEL]]
+"""
+
+import argparse
+import functools
+import logging
+import time
+import game_bot
+import game_server
+import server_backend
+
+
+ROUND_ROBIN = "round-robin"
+BRACKET = "bracket"
+FORMATS = (ROUND_ROBIN, BRACKET)
+
+_DEFAULT_NUM_PLAYERS = 64
+_DEFAULT_NUM_GAMES = 3
+_DEFAULT_GAME_TIMEOUT = 10
+_MATCH_WINS = 0
+_GAME_WINS = 1
+_POINTS = 2
+
+
+def round_robin_rounds(players):
+    """Returns the rounds of a round-robin tournament as lists of pairs.
+
+    Each player plays every other player once. With an odd number of
+    players, a different player sits out in each round.
+    """
+    players = list(players)
+    if len(players) % 2:
+        players.append(None)
+    rounds = []
+    for _ in range(0, len(players) - 1):
+        pairs = [(players[i], players[len(players) - 1 - i]) for i in range(0, len(players) // 2)]
+        rounds.append([pair for pair in pairs if None not in pair])
+        # the first player stays in place and the others rotate
+        players = [players[0], players[-1]] + players[1:-1]
+    return rounds
+
+
+def bracket_pairs(players):
+    """Returns the pairs of a round of a single elimination bracket and the
+    player who advances without playing, which is None for an even number of
+    players.
+
+    Players are given in the order of their seeds. The best seed plays the
+    worst one, and gets the bye with an odd number of players.
+    """
+    bye = None
+    if len(players) % 2:
+        bye = players[0]
+        players = players[1:]
+    return [(players[i], players[len(players) - 1 - i]) for i in range(0, len(players) // 2)], bye
+
+
+class _MemoryBot(game_bot.Bot):
+    def __init__(self, name, stream):
+        super().__init__(name, stream, stream)
+
+    async def send(self, data):
+        await self.writer.write(data)
+
+
+class Match:
+    """A scheduled pairing of two players, who play a number of games"""
+
+    def __init__(self, room, player1, player2):
+        self.room = room
+        self.players = (player1, player2)
+        self.wins = [0, 0]
+        self.points = [0, 0]
+        self.moves = 0
+        # whether the match is cut short by its time limit
+        self.timed_out = False
+
+    def winner(self):
+        """Returns the player with more wins, then with more points. The
+        first player, who is the better seed, wins a complete tie."""
+        side = 1 if (self.wins[1], self.points[1]) > (self.wins[0], self.points[0]) else 0
+        return self.players[side]
+
+
+class Tournament:
+    """Schedules the rounds of a tournament and plays the matches of each
+    round at the same time, with a pair of in-process bots per match.
+
+    run() must be run by game_server.run_in_process(). See run_tournament().
+    """
+
+    def __init__(self, backend, players, tournament_format=ROUND_ROBIN, num_games=_DEFAULT_NUM_GAMES,
+                 game_timeout=_DEFAULT_GAME_TIMEOUT):
+        """Initializes the tournament of the given player names.
+
+        backend is the server_backend backend of the game server. players are
+        in the order of their seeds for brackets. Each match is cut short
+        after num_games * game_timeout seconds.
+        """
+        if tournament_format not in FORMATS or len(players) < 2 or len(set(players)) != len(players) \
+                or num_games < 1 or game_timeout <= 0:
+            raise ValueError
+        self._backend = backend
+        self.players = list(players)
+        self.format = tournament_format
+        self.num_games = num_games
+        self.game_timeout = game_timeout
+        self.matches = []
+        self.champion = None
+        self._num_rounds = 0
+        # match wins, game wins and points of each player
+        self._standings = {player: [0, 0, 0] for player in self.players}
+
+    def standings(self):
+        """Returns (player, (match wins, game wins, points)) tuples, best first"""
+        return sorted(((player, tuple(standing)) for (player, standing) in self._standings.items()),
+                      key=lambda item: item[1], reverse=True)
+
+    def num_played_games(self):
+        return len(self.matches) * self.num_games
+
+    def num_played_moves(self):
+        return sum(match.moves for match in self.matches)
+
+    def num_timed_out_matches(self):
+        return sum(1 for match in self.matches if match.timed_out)
+
+    async def run(self):
+        if self.format == ROUND_ROBIN:
+            for pairs in round_robin_rounds(self.players):
+                await self._play_round(pairs)
+            self.champion = self.standings()[0][0]
+            return
+
+        remaining = self.players
+        while len(remaining) > 1:
+            (pairs, bye) = bracket_pairs(remaining)
+            winners = [match.winner() for match in await self._play_round(pairs)]
+            if bye:
+                winners.append(bye)
+            # winners keep their seeds for the next round
+            remaining = sorted(winners, key=self.players.index)
+        self.champion = remaining[0]
+
+    async def _play_round(self, pairs):
+        self._num_rounds += 1
+        matches = [Match("round%d-%d" % (self._num_rounds, i), player1, player2)
+                   for (i, (player1, player2)) in enumerate(pairs)]
+        async with self._backend.TaskGroup(wait_all=True) as g:
+            for match in matches:
+                await g.spawn(self._play_match, match)
+        for match in matches:
+            self._record(match)
+        self.matches += matches
+        return matches
+
+    async def _play_match(self, match):
+        # the group is done once either the match or its time limit is over
+        async with self._backend.TaskGroup() as g:
+            await g.spawn(self._play_bots, match)
+            await g.spawn(self._backend.sleep, self.num_games * self.game_timeout)
+        if match.timed_out:
+            logging.getLogger("tournament").warning("%s vs %s in %s is cut short after %g seconds.",
+                                                    match.players[0], match.players[1], match.room,
+                                                    self.num_games * self.game_timeout)
+
+    async def _play_bots(self, match):
+        # cleared once both bots are done, unless they are cancelled
+        match.timed_out = True
+        async with self._backend.TaskGroup(wait_all=True) as g:
+            for side in (0, 1):
+                await g.spawn(game_server.connect_in_process, functools.partial(self._play_bot, match, side),
+                              "%s:%s" % (match.room, match.players[side]))
+        match.timed_out = False
+
+    async def _play_bot(self, match, side, stream):
+        name = match.players[side]
+        await stream.write(("@room %s @json %s\n" % (match.room, name)).encode("UTF-8"))
+        # skip the name prompt and the welcome line
+        await stream.readline()
+        await stream.readline()
+        bot = _MemoryBot(name, stream)
+        try:
+            await bot.play(self.num_games)
+        finally:
+            # the games finished before the time limit are counted as well
+            match.wins[side] = bot.wins
+            match.points[side] = bot.points
+            match.moves += len(bot.latencies)
+
+    def _record(self, match):
+        if not match.timed_out:
+            self._standings[match.winner()][_MATCH_WINS] += 1
+        for side in (0, 1):
+            standing = self._standings[match.players[side]]
+            standing[_GAME_WINS] += match.wins[side]
+            standing[_POINTS] += match.points[side]
+
+
+def run_tournament(tournament, backend, num_rows=None, num_cols=None, workers=None):
+    """Runs the tournament on an in-process game server on the given backend.
+
+    num_rows, num_cols and workers are the game server settings, and the
+    server defaults are used if they are not given.
+    """
+    # bots leave right after their last game. their games are not kept
+    # around for reconnecting.
+    backend.run(game_server.run_in_process(tournament.run, backend, num_rows, num_cols, 0, workers))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Runs a tournament of bots on an in-process game server.')
+    parser.add_argument("--players", dest="players", type=int, nargs='?', default=_DEFAULT_NUM_PLAYERS,
+                        help="number of bots")
+    parser.add_argument("--format", dest="format", choices=FORMATS, default=ROUND_ROBIN,
+                        help="round-robin or single elimination bracket")
+    parser.add_argument("--games", dest="games", type=int, nargs='?', default=_DEFAULT_NUM_GAMES,
+                        help="number of games in a match")
+    parser.add_argument('--rows', dest="rows", type=int, nargs='?', default=game_server._DEFAULT_NUM_ROWS,
+                        help='number of rows in the game deck')
+    parser.add_argument('--cols', dest="cols", type=int, nargs='?', default=game_server._DEFAULT_NUM_COLS,
+                        help='number of cols in the game deck')
+    parser.add_argument('--backend', dest="backend", choices=server_backend.BACKENDS,
+                        default=server_backend.CURIO_BACKEND, help='event loop backend of the server')
+    parser.add_argument('--loop', dest="loop", choices=server_backend.LOOPS,
+                        default=server_backend.ASYNCIO_LOOP,
+                        help='event loop implementation of the asyncio backend')
+    parser.add_argument('--workers', dest="workers", type=int, nargs='?', default=0,
+                        help='number of workers to run the games on, 0 to run them on the event loop')
+    parser.add_argument('--game-timeout', dest="game_timeout", type=float, nargs='?',
+                        default=_DEFAULT_GAME_TIMEOUT, help='seconds a match may take per game')
+    parser.add_argument('--log-level', dest="log_level", nargs='?', default="ERROR",
+                        help='logging level of the game server, such as INFO or WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s [%(levelname)s] %(name)s : %(message)s', level=args.log_level.upper())
+
+    backend = server_backend.create_backend(args.backend, args.loop)
+    tournament = Tournament(backend, ["bot%d" % i for i in range(0, args.players)], args.format, args.games,
+                            args.game_timeout)
+    started = time.perf_counter()
+    run_tournament(tournament, backend, args.rows, args.cols, args.workers)
+    elapsed = time.perf_counter() - started
+
+    print("%-12s %12s %12s %12s" % ("player", "match wins", "game wins", "points"))
+    for (player, standing) in tournament.standings()[0:10]:
+        print("%-12s %12d %12d %12d" % ((player,) + standing))
+    print("champion: %s" % (tournament.champion))
+    if tournament.num_timed_out_matches():
+        print("%d matches are cut short" % (tournament.num_timed_out_matches()))
+    print("%d matches, %d games, %d moves in %.1f seconds: %.0f games/s, %.0f moves/s" % (
+        len(tournament.matches), tournament.num_played_games(), tournament.num_played_moves(), elapsed,
+        tournament.num_played_games() / elapsed, tournament.num_played_moves() / elapsed))
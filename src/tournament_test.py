@@ -0,0 +1,85 @@
+import itertools
+import pytest
+import game_server
+import game_workers
+import server_backend
+from server_backend import AsyncioBackend
+from tournament import Tournament, Match, round_robin_rounds, bracket_pairs, ROUND_ROBIN, BRACKET, run_tournament
+
+
+def test_round_robin_rounds():
+    players = ["p%d" % i for i in range(0, 5)]
+
+    rounds = round_robin_rounds(players)
+
+    assert len(rounds) == 5
+    pairs = [frozenset(pair) for pairs in rounds for pair in pairs]
+    assert sorted(pairs, key=sorted) == sorted(map(frozenset, itertools.combinations(players, 2)), key=sorted)
+    for pairs in rounds:
+        assert len(set(player for pair in pairs for player in pair)) == 4
+
+
+def test_bracket_pairs():
+    assert bracket_pairs(["p1", "p2", "p3", "p4"]) == ([("p1", "p4"), ("p2", "p3")], None)
+    assert bracket_pairs(["p1", "p2", "p3"]) == ([("p2", "p3")], "p1")
+
+
+def test_match_winner():
+    match = Match("room", "p1", "p2")
+    assert match.winner() == "p1"
+
+    match.wins = [1, 1]
+    match.points = [10, 14]
+    assert match.winner() == "p2"
+
+
+def test_invalid_tournament():
+    with pytest.raises(ValueError):
+        Tournament(AsyncioBackend(), ["p1", "p1"])
+
+
+@pytest.mark.parametrize("backend_name", server_backend.BACKENDS)
+@pytest.mark.parametrize("tournament_format", [ROUND_ROBIN, BRACKET])
+def test_tournament(tournament_format, backend_name):
+    backend = server_backend.create_backend(backend_name)
+    tournament = Tournament(backend, ["p%d" % i for i in range(0, 5)], tournament_format, num_games=2)
+
+    run_tournament(tournament, backend)
+
+    num_matches = 10 if tournament_format == ROUND_ROBIN else 4
+    assert len(tournament.matches) == num_matches
+    assert tournament.num_played_games() == num_matches * 2
+    assert tournament.num_played_moves() > 0
+    assert tournament.champion
+    standings = tournament.standings()
+    assert sum(standing[0] for (_, standing) in standings) == num_matches
+    if tournament_format == ROUND_ROBIN:
+        assert standings[0][0] == tournament.champion
+
+
+@pytest.mark.parametrize("backend_name", server_backend.BACKENDS)
+def test_matches_of_crashed_games_time_out(backend_name, monkeypatch):
+    async def crash(*args):
+        raise RuntimeError("crashed")
+
+    monkeypatch.setattr(game_workers.PooledGame, "start", crash)
+    backend = server_backend.create_backend(backend_name)
+    tournament = Tournament(backend, ["p1", "p2", "p3"], BRACKET, num_games=1, game_timeout=0.1)
+
+    run_tournament(tournament, backend)
+
+    assert tournament.num_timed_out_matches() == 2
+    assert tournament.champion == "p1"
+    assert all(standing == (0, 0, 0) for (_, standing) in tournament.standings())
+
+
+def test_tournament_leaves_server_settings():
+    backend = AsyncioBackend()
+    tournament = Tournament(backend, ["p1", "p2"], num_games=1)
+
+    run_tournament(tournament, backend, num_rows=2, num_cols=2)
+
+    assert tournament.num_played_moves() > 0
+    assert game_server._RECONNECT_GRACE == game_server._DEFAULT_RECONNECT_GRACE
+    assert (game_server._NUM_ROWS, game_server._NUM_COLS) == (
+        game_server._DEFAULT_NUM_ROWS, game_server._DEFAULT_NUM_COLS)